@@ -4,15 +4,23 @@ from flask import Flask, render_template, request, jsonify, send_file, send_from
 import os
 import subprocess
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.exceptions import NotFound
 # from filelock import FileLock  # not using this anymore since we switched to mongo
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, BulkWriteError
+from bson import ObjectId, json_util
 import json
+import base64
 import threading
 import time
 import difflib
+import mimetypes
+import queue
+import re
+from collections import OrderedDict
 
 # google oauth stuff - had to figure this out the hard way
 import requests
@@ -20,7 +28,8 @@ import requests
 # Google Drive API imports
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+from googleapiclient.errors import HttpError
 
 # load all the config stuff
 load_dotenv()
@@ -39,6 +48,19 @@ VIDEO_STORAGE_MODE = os.getenv('VIDEO_STORAGE_MODE', 'local')  # "local", "gdriv
 GDRIVE_FOLDER_ID = os.getenv('GDRIVE_FOLDER_ID')
 GOOGLE_CREDENTIALS_PATH = os.getenv('GOOGLE_CREDENTIALS_PATH')
 
+# local read-through cache for videos that only live in Google Drive
+GDRIVE_CACHE_FOLDER = os.getenv('GDRIVE_CACHE_FOLDER') or os.path.join(UPLOAD_FOLDER or '.', 'gdrive_cache')
+GDRIVE_CACHE_MAX_BYTES = int(float(os.getenv('GDRIVE_CACHE_MAX_GB', '10')) * 1024**3)
+
+# Media response caching / proxy offload
+# MEDIA_ACCEL_MODE: "" (Flask sends the bytes), "x-accel" (nginx X-Accel-Redirect), "x-sendfile" (apache/lighttpd)
+MEDIA_ACCEL_MODE = os.getenv('MEDIA_ACCEL_MODE', '').lower()
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected').rstrip('/')
+VIDEO_CACHE_MAX_AGE = int(os.getenv('VIDEO_CACHE_MAX_AGE', '300'))  # seconds; videos can be replaced under the same name
+THUMB_IMMUTABLE_MAX_AGE = 31536000  # one year for versioned (?v=) thumbnail urls
+PLACEHOLDER_THUMB = os.getenv('PLACEHOLDER_THUMB') or 'static/images/video_placeholder.png'
+THUMB_VARIANT_WIDTH = int(os.getenv('THUMB_VARIANT_WIDTH', '320'))  # list pages show thumbnails at ~100px wide
+
 # app image for logo and favicon
 APP_IMAGE = os.getenv('APP_IMAGE', 'static/images/pawg_patch.png')
 
@@ -64,6 +86,13 @@ APPLICABLE_WING = os.getenv('APPLICABLE_WING', 'PAWG')
 # MongoDB configuration
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'cov_inspections')
+# connection pool and timeouts - a dead server fails requests after a few seconds instead of hanging them
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '50'))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '5000'))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', '120000'))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '10000'))
 
 # FFmpeg configuration
 FFMPEG_PATH = os.getenv('FFMPEG_PATH', r'C:\ffmpeg\bin\ffmpeg.exe')
@@ -90,37 +119,36 @@ if missing_vars:
     print("Please set these variables in your .env file")
     exit(1)
 
-# Initialize MongoDB connection with validation
+# Initialize MongoDB client. Nothing here touches the network: the driver connects on
+# first use, keeps a pool per server and reconnects by itself after an outage, so the
+# collection handles stay valid and a worker starts even while Mongo is down.
 try:
-    client = MongoClient(MONGODB_URI)
-    
-    # Test MongoDB connection
-    client.admin.command('ping')
-    print(f"✓ MongoDB server connection successful")
+    client = MongoClient(
+        MONGODB_URI,
+        connect=False,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        retryWrites=True,
+        retryReads=True
+    )
     
     # Get database
     db = client[MONGODB_DATABASE]
     
-    # Check if database exists and has collections
-    collections = db.list_collection_names()
-    print(f"✓ Connected to database: {MONGODB_DATABASE}")
-    print(f"✓ Found {len(collections)} collections: {collections}")
-    
     # Initialize hardcoded collections
     inspections_collection = db['inspections']
     users_collection = db['users']
     events_collection = db['events']
     activity_collection = db['activity_log']
-    
-    # Check if database is empty (no collections or no data)
-    if not collections:
-        print(f"   The application will create collections as needed")
-    else:
-        # Check if key collections have data
-        inspection_count = inspections_collection.count_documents({})
-        user_count = users_collection.count_documents({})
+    cov_summary_collection = db['cov_summary']  # one pre-aggregated row per COV
         
 except Exception as e:
+    # only a malformed URI / option ends up here
+    print(f"❌ Invalid MongoDB configuration: {e}")
     
     # Fallback to None - will be handled in functions
     client = None
@@ -129,6 +157,22 @@ except Exception as e:
     users_collection = None
     events_collection = None
     activity_collection = None
+    cov_summary_collection = None
+
+def check_mongo_connection_in_background():
+    """Log whether MongoDB is reachable without holding up startup"""
+    def run():
+        try:
+            client.admin.command('ping')
+            print(f"✓ MongoDB server connection successful ({MONGODB_DATABASE})")
+        except Exception as e:
+            print(f"⚠️ MongoDB not reachable yet, requests will retry as it comes back: {e}")
+    if client is None:
+        return None
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return thread
 
 # Google Drive service initialization
 def get_google_drive_service():
@@ -159,9 +203,9 @@ def create_or_find_folder(service, folder_name, parent_folder_id=None):
     """Create or find a folder in Google Drive"""
     try:
         # Search for existing folder
-        query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+        query = f"name='{drive_query_escape(folder_name)}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
         if parent_folder_id:
-            query += f" and parents in '{parent_folder_id}'"
+            query += f" and '{drive_query_escape(parent_folder_id)}' in parents"
         
         results = service.files().list(
             q=query,
@@ -245,32 +289,208 @@ def upload_to_google_drive(file_path, filename, folder_id=None, event_name=None,
         print(f"❌ {error_msg}")
         return None, error_msg
 
-def serve_from_google_drive(filename):
-    """Serve video directly from Google Drive"""
+# Drive read-through cache - repeat views come off local disk instead of Drive
+# files are stored as "<drive file id>@<video filename>", so a re-upload or a different
+# file with the same name never gets served from an old copy
+# index is cache name -> size in bytes, oldest (least recently used) first
+gdrive_cache_index = OrderedDict()
+gdrive_cache_by_filename = {}  # video filename -> cache name, for old records with no file id
+gdrive_cache_bytes = 0
+gdrive_cache_lock = threading.Lock()
+gdrive_cache_inflight = {}  # cache name -> threading.Event while a download is running
+
+def gdrive_cache_name(file_id, filename):
+    return f"{file_id}@{filename}"
+
+def lookup_gdrive_cache(filename, file_id=None):
+    """Cache name of a stored copy of this Drive file (marked recently used), or None"""
+    with gdrive_cache_lock:
+        cache_name = gdrive_cache_name(file_id, filename) if file_id else gdrive_cache_by_filename.get(filename)
+        if cache_name in gdrive_cache_index:
+            gdrive_cache_index.move_to_end(cache_name)
+            return cache_name
+    return None
+
+def load_gdrive_cache_index():
+    """Rebuild the cache index from whatever is already on disk (oldest mtime first)"""
+    global gdrive_cache_bytes
+    os.makedirs(GDRIVE_CACHE_FOLDER, exist_ok=True)
+    entries = []
+    for entry in os.scandir(GDRIVE_CACHE_FOLDER):
+        if not entry.is_file():
+            continue
+        if '.part-' in entry.name or '@' not in entry.name:
+            # leftover from a download that died halfway through, or from before the
+            # cache was keyed by file id (can't tell which Drive file it came from)
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime, entry.name, stat.st_size))
+    
+    with gdrive_cache_lock:
+        gdrive_cache_index.clear()
+        gdrive_cache_by_filename.clear()
+        for _, name, size in sorted(entries):
+            gdrive_cache_index[name] = size
+            gdrive_cache_by_filename[name.split('@', 1)[1]] = name
+        gdrive_cache_bytes = sum(gdrive_cache_index.values())
+
+def evict_gdrive_cache(keep=None):
+    """Drop least recently used files until the cache fits in its byte budget"""
+    global gdrive_cache_bytes
+    with gdrive_cache_lock:
+        for name in list(gdrive_cache_index.keys()):
+            if gdrive_cache_bytes <= GDRIVE_CACHE_MAX_BYTES:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(GDRIVE_CACHE_FOLDER, name))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # still open by another request (windows won't delete it) - try again next time
+                continue
+            gdrive_cache_bytes -= gdrive_cache_index.pop(name)
+            filename = name.split('@', 1)[1]
+            if gdrive_cache_by_filename.get(filename) == name:
+                del gdrive_cache_by_filename[filename]
+
+def download_from_google_drive(file_id, dest_path):
+    """Stream a Drive file to disk in chunks (never holds the whole video in memory)"""
+    service = get_google_drive_service()
+    if not service:
+        raise RuntimeError("Google Drive service unavailable")
+    
+    temp_path = f"{dest_path}.part-{threading.get_ident()}"
     try:
-        service = get_google_drive_service()
-        if not service:
-            return "Google Drive service unavailable", 503
+        with open(temp_path, 'wb') as fh:
+            downloader = MediaIoBaseDownload(
+                fh,
+                service.files().get_media(fileId=file_id, supportsAllDrives=True),
+                chunksize=8 * 1024 * 1024
+            )
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+        os.replace(temp_path, dest_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+GDRIVE_FOLDER_DEPTH = 2  # videos sit in GDRIVE_FOLDER_ID/<event>/COV_<n>/ (see upload_to_google_drive)
+
+def drive_query_escape(value):
+    """Quote a value for a Drive search query string"""
+    return str(value).replace('\\', '\\\\').replace("'", "\\'")
+
+def find_google_drive_file_id(filename):
+    """Look up a Drive file id by name (only needed for old records without gdrive_file_id).
+    
+    Only files under GDRIVE_FOLDER_ID count - directly in it or in its event/COV folders -
+    so a file with the same name elsewhere on the drive is never picked up."""
+    service = get_google_drive_service()
+    if not service or not GDRIVE_FOLDER_ID:
+        return None
+    
+    results = service.files().list(
+        q=f"name='{drive_query_escape(filename)}' and trashed=false",
+        fields="files(id,name,parents)",
+        supportsAllDrives=True,
+        includeItemsFromAllDrives=True
+    ).execute()
+    folder_parents = {}
+    for found in results.get('files', []):
+        if drive_file_in_folder(service, found.get('parents', []), GDRIVE_FOLDER_ID, folder_parents):
+            return found['id']
+    return None
+
+def drive_file_in_folder(service, parents, folder_id, folder_parents):
+    """True if folder_id is one of parents or up to GDRIVE_FOLDER_DEPTH folders above them"""
+    level = list(parents)
+    for _ in range(GDRIVE_FOLDER_DEPTH + 1):
+        if folder_id in level:
+            return True
+        next_level = []
+        for parent in level:
+            if parent not in folder_parents:
+                folder_parents[parent] = service.files().get(
+                    fileId=parent, fields='parents', supportsAllDrives=True
+                ).execute().get('parents', [])
+            next_level.extend(folder_parents[parent])
+        level = next_level
+    return False
+
+def get_cached_gdrive_file(filename, file_id=None):
+    """Return the local cache path for a Drive video, downloading it once if needed.
+    
+    Entries are keyed by Drive file id; without one (old records) the newest cached
+    copy of that filename is used, else the id gets looked up on Drive. Concurrent
+    requests for the same file wait on the first download instead of each pulling
+    their own copy from Drive."""
+    global gdrive_cache_bytes
+    if not file_id:
+        cache_name = lookup_gdrive_cache(filename)
+        if cache_name:
+            return os.path.join(GDRIVE_CACHE_FOLDER, cache_name)
+        file_id = find_google_drive_file_id(filename)
+        if not file_id:
+            return None
+    
+    cache_name = gdrive_cache_name(file_id, filename)
+    cache_path = os.path.join(GDRIVE_CACHE_FOLDER, cache_name)
+    
+    while True:
+        with gdrive_cache_lock:
+            if cache_name in gdrive_cache_index:
+                gdrive_cache_index.move_to_end(cache_name)
+                return cache_path
             
-        # Find file in Google Drive
-        results = service.files().list(
-            q=f"name='{filename}' and parents in '{GDRIVE_FOLDER_ID}'",
-            fields="files(id,name,webContentLink)"
-        ).execute()
-        
-        files = results.get('files', [])
-        if not files:
+            pending = gdrive_cache_inflight.get(cache_name)
+            if pending is None:
+                pending = threading.Event()
+                gdrive_cache_inflight[cache_name] = pending
+                break
+        
+        # someone else is already downloading this one - wait for them and re-check
+        pending.wait()
+        with gdrive_cache_lock:
+            if cache_name in gdrive_cache_index or cache_name in gdrive_cache_inflight:
+                continue
+        return None
+    
+    try:
+        os.makedirs(GDRIVE_CACHE_FOLDER, exist_ok=True)
+        download_from_google_drive(file_id, cache_path)
+        size = os.path.getsize(cache_path)
+        
+        with gdrive_cache_lock:
+            gdrive_cache_index[cache_name] = size
+            gdrive_cache_by_filename[filename] = cache_name
+            gdrive_cache_bytes += size
+        print(f"✓ Cached {filename} from Google Drive ({size / (1024**2):.1f} MB)")
+        
+        evict_gdrive_cache(keep=cache_name)
+        return cache_path
+    except Exception as e:
+        print(f"❌ Error caching {filename} from Google Drive: {e}")
+        return None
+    finally:
+        with gdrive_cache_lock:
+            gdrive_cache_inflight.pop(cache_name, None)
+        pending.set()
+
+def serve_from_google_drive(filename, file_id=None):
+    """Serve video from Google Drive through the local read-through cache"""
+    try:
+        cache_path = get_cached_gdrive_file(filename, file_id)
+        if not cache_path:
             return "Video not found in Google Drive", 404
-            
-        # Get download URL
-        file_id = files[0]['id']
-        request = service.files().get_media(fileId=file_id)
-        
-        # Stream the file
-        response = make_response(request.execute())
-        response.headers['Content-Type'] = 'video/mp4'
-        response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
-        return response
+        
+        return send_media(GDRIVE_CACHE_FOLDER, os.path.basename(cache_path), max_age=VIDEO_CACHE_MAX_AGE)
         
     except Exception as e:
         return f"Error serving from Google Drive: {str(e)}", 500
@@ -302,18 +522,176 @@ def get_video_location_info(inspection_id):
         print(f"Error getting video location info: {e}")
         return None
 
+# Drive allows at most 100 calls in one batch request
+GDRIVE_BATCH_SIZE = 100
+
+def check_google_drive_files(file_ids):
+    """Check which Drive file ids still exist using batch requests.
+    
+    Returns {file_id: True/False}; ids whose check errored for some other reason
+    (quota, network) are left out so the caller doesn't treat them as missing."""
+    service = get_google_drive_service()
+    if not service:
+        return None
+    
+    results = {}
+    
+    def handle_response(request_id, response, exception):
+        if exception is None:
+            results[request_id] = not response.get('trashed', False)
+        elif isinstance(exception, HttpError) and exception.resp.status == 404:
+            results[request_id] = False
+        else:
+            print(f"⚠️ Could not check Drive file {request_id}: {exception}")
+    
+    file_ids = list(file_ids)
+    for i in range(0, len(file_ids), GDRIVE_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=handle_response)
+        for file_id in file_ids[i:i + GDRIVE_BATCH_SIZE]:
+            batch.add(
+                service.files().get(fileId=file_id, fields='id,trashed', supportsAllDrives=True),
+                request_id=file_id
+            )
+        batch.execute()
+    
+    return results
+
+def combine_video_location(local_exists, gdrive_exists):
+    """Turn where a file actually is into the video_location value we store"""
+    if local_exists and gdrive_exists:
+        return 'both'
+    if local_exists:
+        return 'local'
+    if gdrive_exists:
+        return 'gdrive'
+    return 'none'
+
+def reconcile_video_locations(repair=True):
+    """Compare video_location fields against the local upload folder and Google Drive.
+    
+    Local files are checked with a single directory listing and Drive ids with
+    batch requests, so this is cheap enough to run nightly over the whole archive.
+    Returns a report dict; with repair=True the location fields are fixed in bulk."""
+    started_at = datetime.now()
+    
+    # one listing of the upload folder instead of an os.path.exists per record
+    local_files = set()
+    if UPLOAD_FOLDER and os.path.isdir(UPLOAD_FOLDER):
+        local_files = {entry.name for entry in os.scandir(UPLOAD_FOLDER) if entry.is_file()}
+    
+    projection = {
+        'video_filename': 1, 'video_location': 1, 'gdrive_file_id': 1,
+        'converted_video_filename': 1, 'converted_video_location': 1, 'gdrive_converted_file_id': 1,
+        'van_number': 1, 'event_name': 1
+    }
+    inspections = list(inspections_collection.find({'video_filename': {'$nin': ['', None]}}, projection))
+    
+    drive_ids = set()
+    for inspection in inspections:
+        for field in ('gdrive_file_id', 'gdrive_converted_file_id'):
+            if inspection.get(field):
+                drive_ids.add(inspection[field])
+    
+    drive_status = {}
+    drive_checked = False
+    if drive_ids and VIDEO_STORAGE_MODE in ['gdrive', 'both']:
+        checked = check_google_drive_files(drive_ids)
+        if checked is not None:
+            drive_status = checked
+            drive_checked = True
+    
+    discrepancies = []
+    operations = []
+    drive_unverified = 0
+    for inspection in inspections:
+        updates = {}
+        videos = [
+            ('video_location', 'video_filename', 'gdrive_file_id'),
+            ('converted_video_location', 'converted_video_filename', 'gdrive_converted_file_id')
+        ]
+        for location_field, filename_field, drive_field in videos:
+            filename = inspection.get(filename_field)
+            if not filename:
+                continue
+            
+            stored = inspection.get(location_field, 'local')
+            local_exists = filename in local_files
+            
+            drive_id = inspection.get(drive_field)
+            if drive_id and drive_id in drive_status:
+                gdrive_exists = drive_status[drive_id]
+            else:
+                # couldn't check Drive for this one (not checked, or no file id on record) -
+                # unknown isn't missing, so keep the Drive half of what we had
+                gdrive_exists = stored in ['gdrive', 'both']
+                if gdrive_exists:
+                    drive_unverified += 1
+            
+            actual = combine_video_location(local_exists, gdrive_exists)
+            if actual != stored:
+                updates[location_field] = actual
+                discrepancies.append({
+                    'inspection_id': str(inspection['_id']),
+                    'van_number': inspection.get('van_number', ''),
+                    'event_name': inspection.get('event_name', ''),
+                    'filename': filename,
+                    'field': location_field,
+                    'stored': stored,
+                    'actual': actual,
+                    'gdrive_file_id': drive_id
+                })
+        
+        if updates:
+            updates['updated_at'] = datetime.now()
+            operations.append(UpdateOne({'_id': inspection['_id']}, {'$set': updates}))
+    
+    repaired = 0
+    if repair and operations:
+        result = inspections_collection.bulk_write(operations, ordered=False)
+        repaired = result.modified_count
+        invalidate_video_location()
+        invalidate_response_cache(*VIDEO_CACHE_SCOPES)
+    
+    report = {
+        'started_at': started_at.isoformat(),
+        'finished_at': datetime.now().isoformat(),
+        'inspections_checked': len(inspections),
+        'local_files_found': len(local_files),
+        'drive_files_checked': len(drive_status),
+        'drive_checked': drive_checked,
+        'drive_missing': sum(1 for exists in drive_status.values() if not exists),
+        'drive_unverified': drive_unverified,
+        'discrepancy_count': len(discrepancies),
+        'repaired': repaired,
+        'discrepancies': discrepancies
+    }
+    
+    if activity_collection is not None:
+        try:
+            log_activity({
+                'type': 'videos_reconciled',
+                'inspections_checked': report['inspections_checked'],
+                'discrepancy_count': report['discrepancy_count'],
+                'repaired': repaired,
+                'timestamp': datetime.now().isoformat()
+            })
+        except Exception as e:
+            print(f"Error logging reconciliation activity: {e}")
+    
+    return report
+
 # Google OAuth configuration
 if GOOGLE_OAUTH:
     # OAuth 2.0 client configuration
     SCOPES = ['openid', 'email', 'profile']
 
-def generate_video_thumbnail(video_filename):
+def generate_video_thumbnail(video_filename, video_path=None):
     """make a thumbnail for the video - ffmpeg is pretty cool for this"""
     try:
         # make sure the thumbnails folder exists
         os.makedirs(THUMB_FOLDER, exist_ok=True)
         
-        video_path = os.path.join(UPLOAD_FOLDER, video_filename)
+        video_path = video_path or os.path.join(UPLOAD_FOLDER, video_filename)
         thumbnail_name = os.path.splitext(video_filename)[0] + '.jpg'
         thumbnail_path = os.path.join(THUMB_FOLDER, thumbnail_name)
         
@@ -343,6 +721,7 @@ def generate_video_thumbnail(video_filename):
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
         
         if result.returncode == 0:
+            generate_thumbnail_variants(thumbnail_name)
             return True
         else:
             return False
@@ -354,6 +733,162 @@ def generate_video_thumbnail(video_filename):
     except Exception as e:
         return False
 
+# Smaller thumbnail formats, best first. Each is made from the jpg, scaled down for list pages.
+THUMB_VARIANTS = [
+    ('avif', 'image/avif', ['-c:v', 'libaom-av1', '-still-picture', '1', '-crf', '35', '-cpu-used', '6']),
+    ('webp', 'image/webp', ['-c:v', 'libwebp', '-quality', '70'])
+]
+unsupported_thumb_variants = set()  # encoders this ffmpeg build doesn't have - don't keep retrying
+
+def generate_thumbnail_variants(thumbnail_name):
+    """Make webp/avif copies of a jpg thumbnail (whichever ones ffmpeg can encode)"""
+    jpg_path = os.path.join(THUMB_FOLDER, thumbnail_name)
+    base_name = os.path.splitext(thumbnail_name)[0]
+    
+    for ext, mimetype, codec_args in THUMB_VARIANTS:
+        if ext in unsupported_thumb_variants:
+            continue
+        
+        variant_path = os.path.join(THUMB_FOLDER, f"{base_name}.{ext}")
+        # already up to date with the jpg
+        if os.path.exists(variant_path) and os.path.getmtime(variant_path) >= os.path.getmtime(jpg_path):
+            continue
+        
+        cmd = [
+            FFMPEG_PATH,
+            '-i', jpg_path,
+            '-vf', f"scale='min({THUMB_VARIANT_WIDTH},iw)':-2",
+            '-frames:v', '1',
+            *codec_args,
+            '-y',
+            variant_path
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            if result.returncode != 0:
+                if 'Unknown encoder' in result.stderr or 'Encoder not found' in result.stderr:
+                    print(f"⚠️ ffmpeg can't encode {ext} thumbnails, skipping that format")
+                    unsupported_thumb_variants.add(ext)
+                elif os.path.exists(variant_path):
+                    os.remove(variant_path)
+        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+            pass
+
+def thumbnail_source_names(thumbnail_name):
+    """Every video filename a thumbnail could have been made from (mp4 first)"""
+    base_name = os.path.splitext(thumbnail_name)[0]
+    return [f"{base_name}.{ext}" for ext in ['mp4'] + sorted(ALLOWED_EXTENSIONS - {'mp4'})]
+
+def find_thumbnail_inspection(thumbnail_name, projection=None):
+    """Inspection whose video a thumbnail belongs to - exact matches on the video_filename index"""
+    if inspections_collection is None:
+        return None
+    return inspections_collection.find_one(
+        {'video_filename': {'$in': thumbnail_source_names(thumbnail_name)}},
+        projection or {'_id': 1}
+    )
+
+def find_thumbnail_source(thumbnail_name):
+    """Find a video to pull a missing thumbnail from - local file first, then the Drive cache"""
+    base_name = os.path.splitext(thumbnail_name)[0]
+    
+    for name in thumbnail_source_names(thumbnail_name):
+        local_path = os.path.join(UPLOAD_FOLDER, name)
+        if os.path.exists(local_path):
+            return name, local_path
+    
+    if VIDEO_STORAGE_MODE not in ['gdrive', 'both']:
+        return None, None
+    
+    inspection = find_thumbnail_inspection(
+        thumbnail_name, {'video_filename': 1, 'gdrive_file_id': 1, 'gdrive_converted_file_id': 1}
+    )
+    if not inspection:
+        return None, None
+    
+    if inspection.get('gdrive_converted_file_id'):
+        video_filename = base_name + '.mp4'
+        file_id = inspection['gdrive_converted_file_id']
+    else:
+        video_filename = inspection['video_filename']
+        file_id = inspection.get('gdrive_file_id')
+    if not file_id:
+        return None, None
+    return video_filename, get_cached_gdrive_file(video_filename, file_id)
+
+# missing thumbnails get made in the background, one at a time, so a list page full
+# of misses doesn't start a dozen ffmpeg processes at once
+thumbnail_queue = queue.Queue()
+thumbnail_pending = set()
+thumbnail_attempted = OrderedDict()  # thumbnail name -> when we last queued it, oldest first
+thumbnail_pending_lock = threading.Lock()
+thumbnail_worker = None
+
+def thumbnail_worker_loop():
+    """Background worker that makes queued thumbnails"""
+    while True:
+        thumbnail_name = thumbnail_queue.get()
+        try:
+            jpg_path = os.path.join(THUMB_FOLDER, thumbnail_name)
+            if os.path.exists(jpg_path):
+                generate_thumbnail_variants(thumbnail_name)
+            else:
+                video_filename, video_path = find_thumbnail_source(thumbnail_name)
+                if video_path:
+                    if generate_video_thumbnail(video_filename, video_path):
+                        print(f"✓ Generated missing thumbnail: {thumbnail_name}")
+                    else:
+                        print(f"❌ Could not generate thumbnail: {thumbnail_name}")
+        except Exception as e:
+            print(f"❌ Error generating thumbnail {thumbnail_name}: {e}")
+        finally:
+            with thumbnail_pending_lock:
+                thumbnail_pending.discard(thumbnail_name)
+            thumbnail_queue.task_done()
+
+THUMB_RETRY_SECONDS = 600
+THUMB_ATTEMPTED_MAX = 5000  # remembered attempts, so junk names can't grow it forever
+
+def queue_thumbnail_generation(thumbnail_name):
+    """Ask the background worker to make a thumbnail (no-op if it's queued or was just tried)"""
+    global thumbnail_worker
+    now = time.time()
+    with thumbnail_pending_lock:
+        if thumbnail_name in thumbnail_pending:
+            return
+        # don't rerun ffmpeg on every request for a video that's gone or won't decode
+        if now - thumbnail_attempted.get(thumbnail_name, 0) < THUMB_RETRY_SECONDS:
+            return
+        thumbnail_attempted[thumbnail_name] = now
+        thumbnail_attempted.move_to_end(thumbnail_name)
+        while thumbnail_attempted:
+            oldest_name, tried_at = next(iter(thumbnail_attempted.items()))
+            if now - tried_at < THUMB_RETRY_SECONDS and len(thumbnail_attempted) <= THUMB_ATTEMPTED_MAX:
+                break
+            thumbnail_attempted.popitem(last=False)
+    
+    # only bother the worker for names that belong to a video we actually have
+    # (existing jpgs just need their other formats)
+    if not os.path.exists(os.path.join(THUMB_FOLDER, thumbnail_name)):
+        try:
+            has_source = any(os.path.exists(os.path.join(UPLOAD_FOLDER, name)) for name in thumbnail_source_names(thumbnail_name)) \
+                or find_thumbnail_inspection(thumbnail_name) is not None
+        except Exception as e:
+            print(f"❌ Error looking up video for thumbnail {thumbnail_name}: {e}")
+            has_source = False
+        if not has_source:
+            return
+    
+    with thumbnail_pending_lock:
+        if thumbnail_name in thumbnail_pending:
+            return
+        thumbnail_pending.add(thumbnail_name)
+        if thumbnail_worker is None or not thumbnail_worker.is_alive():
+            thumbnail_worker = threading.Thread(target=thumbnail_worker_loop)
+            thumbnail_worker.daemon = True
+            thumbnail_worker.start()
+    thumbnail_queue.put(thumbnail_name)
+
 def convert_video_to_mp4(input_filename, output_filename=None):
     """convert whatever video format to mp4 - mobile devices are picky"""
     try:
@@ -412,10 +947,10 @@ def background_video_processing(video_filename, inspection_id):
             print(f"🔄 Starting background processing for {video_filename}")
             
             # update status to processing
-            inspections_collection.update_one(
+            inspection = update_inspection_video(
                 {'_id': ObjectId(inspection_id)},
-                {'$set': {'video_status': 'processing'}}
-            )
+                {'video_status': 'processing'}
+            ) or {}
             
             
             # Convert video to MP4
@@ -429,7 +964,7 @@ def background_video_processing(video_filename, inspection_id):
                 
                 if VIDEO_STORAGE_MODE in ['gdrive', 'both']:
                     converted_path = os.path.join(UPLOAD_FOLDER, converted_filename)
-                    gdrive_file, gdrive_error = upload_to_google_drive(converted_path, converted_filename, event_name=data.get('event_name'), cov_number=data.get('van_number'))
+                    gdrive_file, gdrive_error = upload_to_google_drive(converted_path, converted_filename, event_name=inspection.get('event_name'), cov_number=inspection.get('van_number'))
                     if gdrive_file:
                         gdrive_converted_id = gdrive_file.get('id')
                         converted_video_location = 'both'  # Now in both local and Google Drive
@@ -451,23 +986,24 @@ def background_video_processing(video_filename, inspection_id):
                 if gdrive_converted_error:
                     update_data['gdrive_converted_error'] = gdrive_converted_error
                 
-                inspections_collection.update_one(
+                update_inspection_video(
                     {'_id': ObjectId(inspection_id)},
-                    {'$set': update_data}
+                    update_data
                 )
+                invalidate_video_location(video_filename)
             else:
                 # Mark as failed
-                inspections_collection.update_one(
+                update_inspection_video(
                     {'_id': ObjectId(inspection_id)},
-                    {'$set': {'video_status': 'failed'}}
+                    {'video_status': 'failed'}
                 )
                 
         except Exception as e:
             # Mark as failed
             try:
-                inspections_collection.update_one(
+                update_inspection_video(
                     {'_id': ObjectId(inspection_id)},
-                    {'$set': {'video_status': 'failed'}}
+                    {'video_status': 'failed'}
                 )
             except:
                 pass
@@ -479,8 +1015,11 @@ def background_video_processing(video_filename, inspection_id):
     return thread
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.use_x_sendfile = MEDIA_ACCEL_MODE == 'x-sendfile'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(THUMB_FOLDER, exist_ok=True)
+if VIDEO_STORAGE_MODE in ['gdrive', 'both']:
+    load_gdrive_cache_index()
 
 # Field definitions
 CHECKLIST_FIELDS = [
@@ -501,10 +1040,83 @@ ARRIVAL_FIELDS = [
 def allowed_file(fn):
     return '.' in fn and fn.rsplit('.',1)[1].lower() in ALLOWED_EXTENSIONS
 
+def inspection_record_from_form(form):
+    """Inspection document from submitted form fields (a request.form or a plain dict),
+    with no video yet. Shared by /upload and the batch endpoint."""
+    data = {
+        'date': form.get('date',''),
+        'inspector_id': form.get('inspector_id',''),
+        'van_number': form.get('van_number',''),
+        'odometer_in': form.get('odometer_in',''),
+        'license_plate': form.get('license_plate',''),
+        'inspection_sticker': form.get('inspection_sticker',''),
+        'comments': form.get('comments',''),
+        'engine_oil': form.get('engine_oil',''),
+        'transmission_fluid': form.get('transmission_fluid',''),
+        'wiper_fluid': form.get('wiper_fluid',''),
+        'event_name': form.get('event_name',''),
+        'vin_display_hidden': form.get('vin_display_hidden',''),
+        'vin_confirmed': form.get('vin_confirmed'),
+        'video_filename': '',
+        'video_status': 'none',
+        'video_location': 'none',
+        'gdrive_file_id': None,
+        'gdrive_error': None,
+        'storage_mode': VIDEO_STORAGE_MODE,
+        'created_at': datetime.now(),
+        'updated_at': datetime.now()
+    }
+    
+    # Checklist radios
+    for f in CHECKLIST_FIELDS:
+        data[f] = form.get(f, 'No')
+    
+    # Arrival sliders - convert to percentages
+    for f in ARRIVAL_FIELDS:
+        value = str(form.get(f, '') or '')
+        if value and value.isdigit():
+            # Convert to percentage based on field type
+            if f == 'arrival_fuel_level':
+                # Fuel: 8 increments (0-8)
+                percentage = round((int(value) / 8) * 100, 1)
+            else:
+                # Other fluids: 4 increments (0-4)
+                percentage = round((int(value) / 4) * 100, 1)
+            data[f] = f"{percentage}%"
+        else:
+            data[f] = ''
+
+    # tire date codes - had to add these for the new requirements
+    tire_fields = ['tire_fl', 'tire_fr', 'tire_rl', 'tire_rr', 'tire_spare']
+    for f in tire_fields:
+        data[f] = form.get(f, '')
+    return data
+
 @app.route('/upload', methods=['POST'])
 def upload():
     if inspections_collection is None:
         return jsonify({'status': 'error', 'message': 'Database not available'}), 500
+
+    # a retry of a submission we already have - answer with the stored one before
+    # saving the video again (the DuplicateKeyError below only covers two retries racing)
+    idempotency_key = request.form.get('idempotency_key')
+    if idempotency_key:
+        try:
+            existing = inspections_collection.find_one({'idempotency_key': idempotency_key}, {'_id': 1})
+        except Exception as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 500
+        if existing:
+            return jsonify({'status': 'success', 'duplicate': True, 'inspection_id': str(existing['_id'])})
+
+    # refuse locked events before saving anything (in-memory lock map, see get_event_locks)
+    event_name = request.form.get('event_name', '')
+    try:
+        locked = get_event_lock(event_name)
+    except Exception as e:
+        print(f"Error checking lock for event {event_name}: {e}")
+        return jsonify({'status': 'error', 'message': 'Could not check whether the event is locked - please try again'}), 503
+    if locked:
+        return jsonify({'status': 'error', 'message': f'Event "{event_name}" is locked - no new inspections can be added'}), 403
     
     video_file = request.files.get('inspection_video')
     video_filename = ''
@@ -553,7 +1165,7 @@ def upload():
             
             if upload_path and os.path.exists(upload_path):
                 # Upload to Google Drive
-                gdrive_file, gdrive_error = upload_to_google_drive(upload_path, video_filename, event_name=data.get('event_name'), cov_number=data.get('van_number'))
+                gdrive_file, gdrive_error = upload_to_google_drive(upload_path, video_filename, event_name=request.form.get('event_name'), cov_number=van)
                 if gdrive_file:
                     gdrive_file_id = gdrive_file.get('id')
                     gdrive_success = True
@@ -581,61 +1193,41 @@ def upload():
             print(f"❌ Video upload completely failed for: {video_filename}")
 
     # Collect all form data
-    data = {
-        'date': request.form.get('date',''),
-        'inspector_id': request.form.get('inspector_id',''),
-        'van_number': request.form.get('van_number',''),
-        'odometer_in': request.form.get('odometer_in',''),
-        'license_plate': request.form.get('license_plate',''),
-        'inspection_sticker': request.form.get('inspection_sticker',''),
-        'comments': request.form.get('comments',''),
-        'engine_oil': request.form.get('engine_oil',''),
-        'transmission_fluid': request.form.get('transmission_fluid',''),
-        'wiper_fluid': request.form.get('wiper_fluid',''),
-        'event_name': request.form.get('event_name',''),
-        'vin_display_hidden': request.form.get('vin_display_hidden',''),
-        'vin_confirmed': request.form.get('vin_confirmed'),
+    data = inspection_record_from_form(request.form)
+    data.update({
         'video_filename': video_filename,
         'video_status': 'uploaded' if video_filename else 'none',
         'video_location': video_location,
         'gdrive_file_id': gdrive_file_id,
-        'gdrive_error': gdrive_error,
-        'storage_mode': VIDEO_STORAGE_MODE,
-        'created_at': datetime.now(),
-        'updated_at': datetime.now()
-    }
-    
-    # Checklist radios
-    for f in CHECKLIST_FIELDS:
-        data[f] = request.form.get(f, 'No')
-    
-    # Arrival sliders - convert to percentages
-    for f in ARRIVAL_FIELDS:
-        value = request.form.get(f, '')
-        if value and value.isdigit():
-            # Convert to percentage based on field type
-            if f == 'arrival_fuel_level':
-                # Fuel: 8 increments (0-8)
-                percentage = round((int(value) / 8) * 100, 1)
-            else:
-                # Other fluids: 4 increments (0-4)
-                percentage = round((int(value) / 4) * 100, 1)
-            data[f] = f"{percentage}%"
-        else:
-            data[f] = ''
-
-    # tire date codes - had to add these for the new requirements
-    tire_fields = ['tire_fl', 'tire_fr', 'tire_rl', 'tire_rr', 'tire_spare']
-    for f in tire_fields:
-        data[f] = request.form.get(f, '')
+        'gdrive_error': gdrive_error
+    })
+    if idempotency_key:
+        data['idempotency_key'] = idempotency_key
 
     try:
         # Insert into MongoDB
-        result = inspections_collection.insert_one(data)
+        try:
+            result = inspections_collection.insert_one(data)
+        except DuplicateKeyError:
+            # another retry of the same submission got in first
+            existing = inspections_collection.find_one({'idempotency_key': idempotency_key}, {'_id': 1}) if idempotency_key else None
+            if not existing:
+                raise
+            return jsonify({'status': 'success', 'duplicate': True, 'inspection_id': str(existing['_id'])})
         inspection_id = str(result.inserted_id)
         
+        bump_data_version('events')
+        refresh_cov_summary(data['van_number'])
+        adjust_admin_stats(
+            total_inspections=1,
+            total_events=1 if is_first_event_inspection(data['event_name']) else 0,
+            videos_with_issues=is_video_issue(data)
+        )
+        invalidate_response_cache(*INSPECTION_CACHE_SCOPES)
+        
         # Start background video processing if video was uploaded
         if video_filename:
+            invalidate_video_location(video_filename)
             print(f"Starting background processing for {video_filename}")  
             background_video_processing(video_filename, inspection_id)     
         resp = {
@@ -656,6 +1248,115 @@ def upload():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# Batch submission for inspections collected offline: one request, one insert_many,
+# a result per item. Each item carries a client-made idempotency_key so a sync that
+# gets cut off can simply be sent again. Videos follow later through /attach_video.
+BATCH_MAX_INSPECTIONS = int(os.getenv('BATCH_MAX_INSPECTIONS', '200'))
+
+def validate_batch_inspection(item):
+    """Error message for one submitted inspection, or None if it's fine"""
+    if not isinstance(item, dict):
+        return 'Inspection must be an object'
+    key = item.get('idempotency_key')
+    if not isinstance(key, str) or not key.strip() or len(key) > 128:
+        return 'idempotency_key is required (string, up to 128 characters)'
+    if not str(item.get('van_number') or '').strip():
+        return 'van_number is required'
+    if not str(item.get('inspector_id') or '').strip():
+        return 'inspector_id is required'
+    if get_event_lock(item.get('event_name')):
+        return f'Event "{item.get("event_name")}" is locked - no new inspections can be added'
+    return None
+
+@app.route('/api/inspections/batch', methods=['POST'])
+def upload_batch():
+    """Insert many inspections at once: {"inspections": [{idempotency_key, ...form fields}]}"""
+    if inspections_collection is None:
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 500
+    
+    payload = request.get_json(silent=True) or {}
+    items = payload.get('inspections')
+    if not isinstance(items, list) or not items:
+        return jsonify({'status': 'error', 'message': 'Send {"inspections": [...]}'}), 400
+    if len(items) > BATCH_MAX_INSPECTIONS:
+        return jsonify({'status': 'error', 'message': f'At most {BATCH_MAX_INSPECTIONS} inspections per batch'}), 400
+    
+    try:
+        results = [None] * len(items)
+        seen_keys = {}
+        for index, item in enumerate(items):
+            error = validate_batch_inspection(item)
+            if not error and item['idempotency_key'] in seen_keys:
+                error = f"Same idempotency_key as item {seen_keys[item['idempotency_key']]}"
+            if error:
+                results[index] = {'index': index, 'idempotency_key': item.get('idempotency_key') if isinstance(item, dict) else None,
+                                  'status': 'error', 'message': error}
+            else:
+                seen_keys[item['idempotency_key']] = index
+        
+        # already stored by an earlier (maybe interrupted) sync
+        existing = {doc['idempotency_key']: doc['_id'] for doc in inspections_collection.find(
+            {'idempotency_key': {'$in': list(seen_keys)}}, {'idempotency_key': 1}
+        )}
+        to_insert = []
+        for key, index in seen_keys.items():
+            if key in existing:
+                results[index] = {'index': index, 'idempotency_key': key, 'status': 'duplicate', 'inspection_id': str(existing[key])}
+            else:
+                record = inspection_record_from_form(items[index])
+                record['idempotency_key'] = key
+                to_insert.append((index, record))
+        
+        inserted = []
+        if to_insert:
+            failed = {}
+            try:
+                inspections_collection.insert_many([record for _, record in to_insert], ordered=False)
+            except BulkWriteError as e:
+                failed = {err['index']: err for err in e.details.get('writeErrors', [])}
+            
+            for position, (index, record) in enumerate(to_insert):
+                key = record['idempotency_key']
+                err = failed.get(position)
+                if err is None:
+                    inserted.append(record)
+                    results[index] = {'index': index, 'idempotency_key': key, 'status': 'created', 'inspection_id': str(record['_id'])}
+                elif err.get('code') == 11000:
+                    # raced with another sync of the same item
+                    doc = inspections_collection.find_one({'idempotency_key': key}, {'_id': 1})
+                    results[index] = {'index': index, 'idempotency_key': key, 'status': 'duplicate', 'inspection_id': str(doc['_id']) if doc else None}
+                else:
+                    results[index] = {'index': index, 'idempotency_key': key, 'status': 'error', 'message': err.get('errmsg', 'Insert failed')}
+        
+        if inserted:
+            bump_data_version('events')
+            refresh_cov_summary(list({record['van_number'] for record in inserted}))
+            
+            # an event is new if everything it has now came in with this batch
+            per_event = {}
+            for record in inserted:
+                per_event[record['event_name']] = per_event.get(record['event_name'], 0) + 1
+            new_events = sum(
+                1 for event_name, count in per_event.items()
+                if inspections_collection.count_documents({'event_name': event_name}, limit=count + 1) == count
+            )
+            adjust_admin_stats(
+                total_inspections=len(inserted),
+                total_events=new_events,
+                videos_with_issues=sum(is_video_issue(record) for record in inserted)
+            )
+            invalidate_response_cache(*INSPECTION_CACHE_SCOPES)
+        
+        return jsonify({
+            'status': 'success',
+            'created': sum(1 for r in results if r['status'] == 'created'),
+            'duplicates': sum(1 for r in results if r['status'] == 'duplicate'),
+            'errors': sum(1 for r in results if r['status'] == 'error'),
+            'results': results
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 def find_member_info(capid):
     try:
         with open(os.path.join(CAPWATCH_PATH, 'Member.txt'), encoding='utf-8') as f:
@@ -668,6 +1369,25 @@ def find_member_info(capid):
         pass
     return None
 
+def find_members_info(capids):
+    """find_member_info for many CAPIDs with one pass over Member.txt"""
+    wanted = {str(c) for c in capids if c}
+    found = {}
+    if not wanted:
+        return found
+    try:
+        with open(os.path.join(CAPWATCH_PATH, 'Member.txt'), encoding='utf-8') as f:
+            f.readline()
+            for ln in f:
+                parts = [v.strip('"') for v in ln.split(',')]
+                if parts[0] in wanted:
+                    found[parts[0]] = {'rank': parts[14], 'first_name': parts[3], 'last_name': parts[2]}
+                    if len(found) == len(wanted):
+                        break
+    except FileNotFoundError:
+        pass
+    return found
+
 def find_capid_by_email(email):
     """Find CAPID by email address in MbrContact.txt"""
     try:
@@ -968,19 +1688,28 @@ def check_capid():
         return jsonify({**info, 'status':'found'})
     return jsonify({'status':'not_found'})
 
+def read_van_vins(path=None):
+    """{van number: VIN} from CAPWATCH vehicles.txt (van number in column 3, vin_id in column 9)"""
+    vans = {}
+    with open(path or os.path.join(CAPWATCH_PATH, 'vehicles.txt'), encoding='utf-8') as f:
+        f.readline()
+        for line in f:
+            parts = line.split(',')
+            if len(parts) > 3:
+                van_number = parts[3].strip('"').strip()
+                if van_number and van_number not in vans:
+                    vans[van_number] = parts[9].strip('"').strip() if len(parts) > 9 else ''
+    return vans
+
 def is_valid_van_number(vn):
     try:
-        with open(os.path.join(CAPWATCH_PATH, 'vehicles.txt'), encoding='utf-8') as f:
-            f.readline()
-            for line in f:
-                parts = line.split(',')
-                if len(parts) > 3 and parts[3].strip('"').strip() == vn:
-                    # Return both validation status and VIN (vin_id is in column 9)
-                    vin_id = parts[9].strip('"').strip() if len(parts) > 9 else ''
-                    return True, vin_id
-            return False, ''
+        vans = read_van_vins()
     except FileNotFoundError:
         return False, ''
+    # Return both validation status and VIN
+    if vn in vans:
+        return True, vans[vn]
+    return False, ''
 
 @app.route('/check_van', methods=['POST'])
 def check_van():
@@ -991,6 +1720,63 @@ def check_van():
         'vin_id': vin_id if is_valid else ''
     })
 
+@app.route('/api/reference/vans', methods=['GET'])
+def reference_vans():
+    """Whole van list (van number -> VIN) so the offline form can validate vans without
+    the server. Versioned by the CAPWATCH file, so clients only download it when it changes."""
+    path = os.path.join(CAPWATCH_PATH, 'vehicles.txt')
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return jsonify({'status': 'error', 'message': 'Vehicle list not available'}), 404
+
+    version_tag = f"vans-{int(stat.st_mtime):x}-{stat.st_size:x}"
+    if request.if_none_match.contains(version_tag):
+        response = make_response('', 304)
+        response.set_etag(version_tag)
+        return response
+
+    response = jsonify({'version': version_tag, 'vans': read_van_vins(path)})
+    response.set_etag(version_tag)
+    response.cache_control.no_cache = True
+    return response
+
+# fields the inspected vans list (and its details popup) actually shows
+INSPECTED_VANS_FIELDS = [
+    'date', 'van_number', 'inspector_id', 'odometer_in', 'license_plate', 'inspection_sticker',
+    'comments', 'event_name', 'video_filename', 'converted_video_filename', 'created_at', 'updated_at',
+    'engine_oil', 'transmission_fluid', 'wiper_fluid', 'form_73',
+    'tire_fl', 'tire_fr', 'tire_rl', 'tire_rr', 'tire_spare'
+] + CHECKLIST_FIELDS + ARRIVAL_FIELDS
+
+def encode_page_cursor(state):
+    """Opaque continuation token (urlsafe base64 of extended json)"""
+    return base64.urlsafe_b64encode(json_util.dumps(state).encode('utf-8')).decode('ascii')
+
+def decode_page_cursor(token):
+    return json_util.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+
+def keyset_filter(sort_criteria, last_values):
+    """Filter for documents that come after last_values in sort order.
+    
+    Missing fields sort as null (lowest), and Mongo only compares values of the same
+    type, so nulls get handled explicitly."""
+    branches = []
+    for i, (field, direction) in enumerate(sort_criteria):
+        value = last_values[i]
+        if value is None:
+            if direction == -1:
+                continue  # nothing sorts below null
+            after = {field: {'$ne': None}}
+        elif direction == 1:
+            after = {field: {'$gt': value}}
+        else:
+            after = {'$or': [{field: {'$lt': value}}, {field: None}]}
+        
+        equal = {f: last_values[j] for j, (f, _) in enumerate(sort_criteria[:i])}
+        branches.append({'$and': [equal, after]} if equal else after)
+    return {'$or': branches} if branches else {'_id': None}
+
 @app.route('/inspected_vans', methods=['GET'])
 def inspected_vans():
     if inspections_collection is None:
@@ -1000,6 +1786,9 @@ def inspected_vans():
         # Get pagination parameters
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 10))
+        cursor_token = request.args.get('cursor')
+        # total: "exact" (default, old behaviour), "approx" (cheap estimate) or "none"
+        total_mode = request.args.get('total', 'exact')
         
         # Get sorting parameters
         sort_by = request.args.get('sort', 'created_at')  # Default: newest first
@@ -1020,22 +1809,62 @@ def inspected_vans():
             sort_criteria = [('event_name', 1), ('created_at', -1)]
         else:
             sort_criteria = [(sort_by, sort_direction)]
+        # _id breaks ties so every document has exactly one place in the order
+        sort_criteria.append(('_id', sort_criteria[-1][1]))
         
         # Build filter criteria
         filter_criteria = {}
         if event_filter:
             filter_criteria['event_name'] = event_filter
         
-        # Get total count
-        total = inspections_collection.count_documents(filter_criteria)
+        query = filter_criteria
+        skip = 0
+        if cursor_token:
+            # Keyset pagination - pick up right after the last row of the previous page
+            try:
+                cursor_state = decode_page_cursor(cursor_token)
+                if not isinstance(cursor_state, dict) or not isinstance(cursor_state.get('last'), list) \
+                        or len(cursor_state['last']) != len(sort_criteria):
+                    raise ValueError('bad cursor')
+            except Exception:
+                return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+            if cursor_state.get('sort') != sort_by or cursor_state.get('order') != sort_order or cursor_state.get('event') != event_filter:
+                return jsonify({'status': 'error', 'message': 'Cursor does not match the requested sort/filter'}), 400
+            query = {'$and': [filter_criteria, keyset_filter(sort_criteria, cursor_state['last'])]}
+        else:
+            # old page-number clients still work, they just pay for the skip
+            skip = (page - 1) * per_page
         
-        # Calculate pagination
-        skip = (page - 1) * per_page
-        pages = (total + per_page - 1) // per_page  # Ceiling division
+        # Get total count
+        total = None
+        if total_mode == 'exact':
+            total = inspections_collection.count_documents(filter_criteria)
+        elif total_mode == 'approx':
+            # collection metadata when unfiltered, otherwise an event_name index count
+            if filter_criteria:
+                total = inspections_collection.count_documents(filter_criteria)
+            else:
+                total = inspections_collection.estimated_document_count()
+        pages = (total + per_page - 1) // per_page if total is not None else None  # Ceiling division
+        
+        projection = {field: 1 for field in INSPECTED_VANS_FIELDS}
+        docs = list(inspections_collection.find(query, projection).sort(sort_criteria).skip(skip).limit(per_page + 1))
+        has_more = len(docs) > per_page
+        docs = docs[:per_page]
+        
+        next_cursor = None
+        if has_more and docs:
+            last_doc = docs[-1]
+            next_cursor = encode_page_cursor({
+                'sort': sort_by,
+                'order': sort_order,
+                'event': event_filter,
+                'last': [last_doc.get(field) for field, _ in sort_criteria]
+            })
         
         res = []
         # Get paginated inspection data with sorting and filtering
-        for doc in inspections_collection.find(filter_criteria).sort(sort_criteria).skip(skip).limit(per_page):
+        for doc in docs:
             inspection_data = {
                 'id': str(doc.get('_id', '')),
                 'date': doc.get('date', ''),
@@ -1047,6 +1876,8 @@ def inspected_vans():
                 'comments': doc.get('comments', ''),
                 'event_name': doc.get('event_name', ''),
                 'video_filename': doc.get('video_filename', ''),
+                'converted_video_filename': doc.get('converted_video_filename', ''),
+                'thumbnail_url': thumbnail_url(doc.get('video_filename')),
                 'created_at': doc.get('created_at', ''),
                 'updated_at': doc.get('updated_at', '')
             }
@@ -1081,9 +1912,12 @@ def inspected_vans():
         return jsonify({
             'inspections': res,
             'total': total,
+            'total_is_estimate': total_mode == 'approx' and not filter_criteria,
             'page': page,
             'pages': pages,
-            'per_page': per_page
+            'per_page': per_page,
+            'has_more': has_more,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         print(f"Error fetching inspected vans: {e}")
@@ -1095,16 +1929,31 @@ def missing_videos():
         return jsonify([])
     
     try:
-        res = []
-        for doc in inspections_collection.find({'video_filename': {'$in': ['', None]}}, {'van_number': 1, 'inspector_id': 1, '_id': 0}):
-            res.append({
-                'van_number': doc.get('van_number', ''),
-                'inspector_id': doc.get('inspector_id', '')
-            })
-        return jsonify(res)
+        return jsonify(cached_response_value('missing_videos', None, load_missing_videos))
     except Exception as e:
         return jsonify([])
 
+missing_videos_normalized = {'confirmed': False}
+
+def missing_videos_query():
+    """Once the schema migration that turns null filenames into '' is recorded as applied,
+    the partial missing_videos index covers the whole query; until then nulls count too"""
+    if not missing_videos_normalized['confirmed'] and db is not None:
+        info = db['schema_info'].find_one({'_id': 'indexes'}, {'version': 1}) or {}
+        missing_videos_normalized['confirmed'] = info.get('version', 0) >= MISSING_VIDEOS_NORMALIZED_VERSION
+    if missing_videos_normalized['confirmed']:
+        return {'video_filename': ''}
+    return {'video_filename': {'$in': [None, '']}}
+
+def load_missing_videos():
+    res = []
+    for doc in inspections_collection.find(missing_videos_query(), {'van_number': 1, 'inspector_id': 1, '_id': 0}):
+        res.append({
+            'van_number': doc.get('van_number', ''),
+            'inspector_id': doc.get('inspector_id', '')
+        })
+    return res
+
 @app.route('/attach_video', methods=['POST'])
 def attach_video():
     if inspections_collection is None:
@@ -1118,6 +1967,26 @@ def attach_video():
     if not (vf and allowed_file(vf.filename)):
         return jsonify({'status':'error','message':'Invalid video'}), 400
     
+    # batch-submitted inspections attach by id (or idempotency key) instead of van + inspector
+    query = {'van_number': van, 'inspector_id': insp, 'video_filename': {'$in': ['', None]}}
+    target_id = request.form.get('inspection_id')
+    target_key = request.form.get('idempotency_key')
+    if target_id or target_key:
+        try:
+            query = {'_id': ObjectId(target_id)} if target_id else {'idempotency_key': target_key}
+        except Exception:
+            return jsonify({'status':'error','message':'Invalid inspection_id'}), 400
+        target = inspections_collection.find_one(query, {'van_number': 1, 'inspector_id': 1, 'date': 1, 'video_filename': 1})
+        if not target:
+            return jsonify({'status':'error','message':'No matching inspection found'}), 404
+        if target.get('video_filename'):
+            # already attached on an earlier try
+            return jsonify({'status':'success','video_filename': target['video_filename'], 'duplicate': True})
+        van = target.get('van_number', '')
+        insp = target.get('inspector_id', '')
+        date = (target.get('date') or 'UNKNOWN').replace('/', '-')
+        query['video_filename'] = {'$in': ['', None]}
+    
     ext = vf.filename.rsplit('.',1)[1].lower()
     fn = f"{van}_{date}_{insp}.{ext}"
     video_path = os.path.join(app.config['UPLOAD_FOLDER'], fn)
@@ -1128,25 +1997,22 @@ def attach_video():
 
     try:
         # Update the first matching record without a video
-        result = inspections_collection.update_one(
-            {'van_number': van, 'inspector_id': insp, 'video_filename': {'$in': ['', None]}},
-            {'$set': {
+        updated_doc = update_inspection_video(
+            query,
+            {
                 'video_filename': fn, 
                 'video_status': 'uploaded',
                 'updated_at': datetime.now()
-            }}
+            }
         )
         
-        if result.modified_count > 0:
-            # Get the updated document to get its ID for background processing
-            updated_doc = inspections_collection.find_one(
-                {'van_number': van, 'inspector_id': insp, 'video_filename': fn}
-            )
+        if updated_doc:
+            invalidate_video_location(fn)
             
-            if updated_doc:
-                inspection_id = str(updated_doc['_id'])
-                print(f"Starting background processing for attached video: {fn}")
-                background_video_processing(fn, inspection_id)
+            # the document as it was before the update still has the id for background processing
+            inspection_id = str(updated_doc['_id'])
+            print(f"Starting background processing for attached video: {fn}")
+            background_video_processing(fn, inspection_id)
             
             return jsonify({'status':'success','video_filename': fn, 'video_status': 'uploaded'})
         else:
@@ -1206,22 +2072,28 @@ def replace_video():
         # Save new video with original filename
         new_video_file.save(original_path)
         
-        # Generate thumbnail for new video
+        # Generate thumbnail for new video (drop the old one first, otherwise it gets kept)
+        for ext in ['jpg'] + [variant[0] for variant in THUMB_VARIANTS]:
+            old_thumbnail = os.path.join(THUMB_FOLDER, f"{os.path.splitext(original_filename)[0]}.{ext}")
+            if os.path.exists(old_thumbnail):
+                os.remove(old_thumbnail)
         thumbnail_success = generate_video_thumbnail(original_filename)
         
         # Update database
-        inspections_collection.update_one(
+        update_inspection_video(
             {'_id': ObjectId(inspection_id)},
-            {'$set': {
+            {
                 'video_filename': original_filename,  # Keep same filename
                 'video_status': 'uploaded',
                 'video_replaced_by': replacing_inspector,
                 'video_replaced_at': datetime.now(),
                 'replaced_video_filename': replaced_filename,
                 'updated_at': datetime.now()
-            }}
+            }
         )
         
+        invalidate_video_location(original_filename)
+        
         # Start background processing for new video
         background_video_processing(original_filename, inspection_id)
         
@@ -1236,49 +2108,222 @@ def replace_video():
     except Exception as e:
         return jsonify({'status':'error','message': str(e)}), 500
 
+def bump_data_version(name):
+    """Mark a cached listing as changed (clients holding the old version tag refetch)"""
+    if db is None:
+        return
+    try:
+        db['data_versions'].update_one({'_id': name}, {'$inc': {'version': 1}}, upsert=True)
+    except Exception as e:
+        print(f"Error bumping {name} version: {e}")
+
+def get_data_version(name):
+    """Current version number of a listing - one primary key lookup"""
+    doc = db['data_versions'].find_one({'_id': name}) if db is not None else None
+    return doc.get('version', 0) if doc else 0
+
+# In-process cache for the read-heavy listings every tablet and dashboard asks for.
+# Entries expire after a per-scope TTL, the cache is size bounded (least recently used
+# goes first), and a miss is computed once while concurrent requests for the same key
+# wait for that result. Writes drop the scopes they affect; the TTL covers whatever
+# another process (ASGI workers) or the background recount changed.
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+RESPONSE_CACHE_TTLS = {  # seconds
+    'events': 60,
+    'covs': 60,
+    'admin_stats': 10,
+    'admin_events': 30,
+    'missing_videos': 30,
+    'recent_activity': 15
+}
+RESPONSE_CACHE_WAIT_SECONDS = 30
+# what each kind of write makes stale
+INSPECTION_CACHE_SCOPES = ('events', 'covs', 'admin_stats', 'admin_events', 'missing_videos', 'recent_activity')
+EVENT_CACHE_SCOPES = ('events', 'admin_events')  # activity entries drop 'recent_activity' in log_activity
+VIDEO_CACHE_SCOPES = ('admin_stats', 'admin_events', 'missing_videos')
+response_cache = OrderedDict()  # (scope, key) -> (expires, value)
+response_cache_inflight = {}  # (scope, key) -> threading.Event while someone computes it
+response_cache_generation = {scope: 0 for scope in RESPONSE_CACHE_TTLS}
+response_cache_stats = {scope: {'hits': 0, 'misses': 0, 'waits': 0, 'invalidations': 0} for scope in RESPONSE_CACHE_TTLS}
+response_cache_lock = threading.Lock()
+
+def cached_response_value(scope, key, compute):
+    """compute() once per (scope, key) per TTL. The value is shared between requests,
+    so callers must not modify it."""
+    cache_key = (scope, key)
+    while True:
+        with response_cache_lock:
+            entry = response_cache.get(cache_key)
+            if entry is not None and entry[0] > time.time():
+                response_cache.move_to_end(cache_key)
+                response_cache_stats[scope]['hits'] += 1
+                return entry[1]
+            waiter = response_cache_inflight.get(cache_key)
+            if waiter is None:
+                waiter = threading.Event()
+                response_cache_inflight[cache_key] = waiter
+                generation = response_cache_generation[scope]
+                response_cache_stats[scope]['misses'] += 1
+                break
+            response_cache_stats[scope]['waits'] += 1
+        # someone else is already computing it - use theirs (or take over if it failed)
+        waiter.wait(RESPONSE_CACHE_WAIT_SECONDS)
+    
+    try:
+        value = compute()
+        with response_cache_lock:
+            # a write while we were computing means this result may already be stale
+            if response_cache_generation[scope] == generation:
+                response_cache[cache_key] = (time.time() + RESPONSE_CACHE_TTLS[scope], value)
+                response_cache.move_to_end(cache_key)
+                while len(response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+                    response_cache.popitem(last=False)
+        return value
+    finally:
+        with response_cache_lock:
+            response_cache_inflight.pop(cache_key, None)
+        waiter.set()
+
+def invalidate_response_cache(*scopes):
+    """Drop cached results for the given scopes (all of them if none given)"""
+    scopes = scopes or tuple(RESPONSE_CACHE_TTLS)
+    with response_cache_lock:
+        for cache_key in [k for k in response_cache if k[0] in scopes]:
+            del response_cache[cache_key]
+        for scope in scopes:
+            response_cache_generation[scope] += 1
+            response_cache_stats[scope]['invalidations'] += 1
+
+def response_cache_metrics():
+    """Hit rate and counters per scope"""
+    with response_cache_lock:
+        sizes = {}
+        for scope, _ in response_cache:
+            sizes[scope] = sizes.get(scope, 0) + 1
+        scopes = {}
+        for scope, stats in response_cache_stats.items():
+            # a request that waited on someone else's computation counts as a wait and then a hit
+            lookups = stats['hits'] + stats['misses']
+            scopes[scope] = {
+                **stats,
+                'entries': sizes.get(scope, 0),
+                'ttl_seconds': RESPONSE_CACHE_TTLS[scope],
+                'hit_rate': round(stats['hits'] / lookups, 3) if lookups else None
+            }
+        return {'entries': len(response_cache), 'max_entries': RESPONSE_CACHE_MAX_ENTRIES, 'scopes': scopes}
+
+def format_timestamp(value):
+    """isoformat datetimes, pass strings through, None stays None"""
+    if not value:
+        return None
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+# Lock state lives on the event document only. Locked events are kept in memory so
+# /upload can check a lock without a database round trip. Lock changes (lock, unlock,
+# event delete, merge, migrations) go through invalidate_event_locks(), which bumps a
+# separate 'event_locks' version - not the busy 'events' one every upload bumps. A
+# process re-reads that version at most every EVENT_LOCK_CHECK_SECONDS, so a lock set by
+# another process is seen within a couple of seconds, and the lock list itself is only
+# reloaded when the version actually moved.
+EVENT_LOCK_CHECK_SECONDS = 2
+event_lock_map = None  # {'version', 'checked_at', 'locks': {name: lock info}}
+event_lock_map_lock = threading.Lock()
+
+def invalidate_event_locks():
+    """Call after any write to an event's lock state (or to which events exist)"""
+    global event_lock_map
+    bump_data_version('event_locks')
+    with event_lock_map_lock:
+        event_lock_map = None
+
+def get_event_locks():
+    """{event name: {'locked_by', 'locked_at'}} for every locked event"""
+    global event_lock_map
+    with event_lock_map_lock:
+        if event_lock_map is not None and time.time() - event_lock_map['checked_at'] < EVENT_LOCK_CHECK_SECONDS:
+            return event_lock_map['locks']
+    
+    version = get_data_version('event_locks')
+    with event_lock_map_lock:
+        if event_lock_map is None or event_lock_map['version'] != version:
+            locks = {}
+            if events_collection is not None:
+                for event in events_collection.find({'is_locked': True}, {'name': 1, 'locked_by': 1, 'locked_at': 1}):
+                    locks[event['name']] = {
+                        'locked_by': event.get('locked_by'),
+                        'locked_at': event.get('locked_at')
+                    }
+            event_lock_map = {'version': version, 'checked_at': time.time(), 'locks': locks}
+        else:
+            event_lock_map['checked_at'] = time.time()
+        return event_lock_map['locks']
+
+def get_event_lock(event_name):
+    """Lock info for an event, or None if it isn't locked.
+    
+    Raises if the lock state can't be read - callers refuse the write rather than
+    letting it through on a locked event."""
+    if not event_name:
+        return None
+    return get_event_locks().get(event_name)
+
 @app.route('/events', methods=['GET'])
 def get_events():
-    """Get list of all events with lock status"""
+    """Get list of all events with lock status and inspection counts"""
     if events_collection is None:
         return jsonify([])
     
     try:
-        events = []
-        for event in events_collection.find({}).sort('name', 1):
-            # Check if this event is locked by looking at any inspection with this event name
-            is_locked = False
-            locked_by = None
-            locked_at = None
-            
-            if inspections_collection is not None:
-                # Find any inspection for this event to check lock status
-                inspection = inspections_collection.find_one({'event_name': event['name']})
-                if inspection:
-                    is_locked = inspection.get('event_locked', False)
-                    locked_by = inspection.get('event_locked_by')
-                    locked_at = inspection.get('event_locked_at')
-            
-            # Handle created_at serialization
-            created_at = event.get('created_at')
-            if created_at and hasattr(created_at, 'isoformat'):
-                created_at = created_at.isoformat()
-            elif created_at:
-                created_at = str(created_at)
-            
-            events.append({
-                'id': str(event['_id']),
-                'name': event['name'],
-                'created_at': created_at,
-                'is_locked': is_locked,
-                'locked_by': locked_by,
-                'locked_at': locked_at.isoformat() if locked_at and hasattr(locked_at, 'isoformat') else str(locked_at) if locked_at else None
-            })
-        
-        return jsonify(events)
+        # Every write that changes this list bumps the version, so an unchanged list
+        # is answered with a 304 without running the aggregation at all
+        version_tag = f"events-{get_data_version('events')}"
+        if request.if_none_match.contains(version_tag):
+            response = make_response('', 304)
+            response.set_etag(version_tag)
+            return response
+        
+        # keyed on the version too, so a change made by another process is never served from here
+        events = cached_response_value('events', version_tag, load_events_list)
+        response = jsonify(events)
+        response.set_etag(version_tag)
+        response.cache_control.no_cache = True  # browsers revalidate with If-None-Match
+        return response
     except Exception as e:
         print(f"Error fetching events: {e}")
         return jsonify([])
 
+def load_events_list():
+    """Events with lock state and inspection counts for /events"""
+    # One aggregation instead of a find_one per event: the count per event comes
+    # from the inspections via the event_name index, lock state from the event itself
+    pipeline = [
+        {'$sort': {'name': 1}},
+        {'$lookup': {
+            'from': 'inspections',
+            'let': {'event_name': '$name'},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$event_name', '$$event_name']}}},
+                {'$count': 'count'}
+            ],
+            'as': 'inspection_stats'
+        }}
+    ]
+    
+    events = []
+    for event in events_collection.aggregate(pipeline):
+        stats = event['inspection_stats'][0] if event['inspection_stats'] else {}
+        
+        events.append({
+            'id': str(event['_id']),
+            'name': event['name'],
+            'created_at': format_timestamp(event.get('created_at')),
+            'is_locked': event.get('is_locked', False),
+            'locked_by': event.get('locked_by'),
+            'locked_at': format_timestamp(event.get('locked_at')),
+            'inspection_count': stats.get('count', 0)
+        })
+    return events
+
 @app.route('/events', methods=['POST'])
 def create_event():
     """Create a new event"""
@@ -1351,6 +2396,8 @@ def create_event():
         }
         
         result = events_collection.insert_one(event_data)
+        bump_data_version('events')
+        invalidate_response_cache(*EVENT_CACHE_SCOPES)
         
         return jsonify({
             'status': 'success',
@@ -1360,6 +2407,16 @@ def create_event():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/service-worker.js')
+def service_worker():
+    # served from the root so it can control the whole site, and never cached so
+    # a new version is picked up on the next visit
+    response = send_from_directory(os.path.join(app.root_path, 'static', 'js'), 'service-worker.js')
+    response.headers['Service-Worker-Allowed'] = '/'
+    response.cache_control.no_cache = True
+    response.cache_control.max_age = 0
+    return response
+
 @app.route('/')
 def home():
     # Check if user is authenticated via Google OAuth
@@ -1415,25 +2472,68 @@ def admin():
 def admin_covs():
     return render_template('admin.html', applicable_wing=APPLICABLE_WING, app_image=APP_IMAGE)
 
+# Exports walk the inspections in batches instead of loading the whole collection
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '500'))
+
+def export_filter_from_args(args):
+    """Build an inspections query from event / van_number / inspector_id / start_date /
+    end_date request args. Returns (query, error message)"""
+    query = {}
+    if args.get('event'):
+        query['event_name'] = args['event']
+    if args.get('van_number'):
+        query['van_number'] = args['van_number']
+    if args.get('inspector_id'):
+        query['inspector_id'] = args['inspector_id']
+    
+    created_at = {}
+    try:
+        if args.get('start_date'):
+            created_at['$gte'] = datetime.strptime(args['start_date'], '%Y-%m-%d')
+        if args.get('end_date'):
+            # end date is inclusive
+            created_at['$lt'] = datetime.strptime(args['end_date'], '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        return None, 'Dates must be YYYY-MM-DD'
+    if created_at:
+        query['created_at'] = created_at
+    return query, None
+
+def iter_inspection_batches(query, projection=None, batch_size=None):
+    """Yield lists of inspections (newest first) straight off a batched cursor"""
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    cursor = inspections_collection.find(query, projection).sort([('created_at', -1), ('_id', -1)]).batch_size(batch_size)
+    try:
+        batch = []
+        for inspection in cursor:
+            batch.append(inspection)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        # a cancelled download stops the generator - free the server cursor right away
+        cursor.close()
+
 @app.route('/admin/export/csv')
 @require_auth
 @require_admin
 def export_csv():
-    """Export all inspection data to CSV"""
+    """Export inspection data to CSV, streamed straight from the cursor.
+    
+    Optional filters: event, start_date and end_date (YYYY-MM-DD, inclusive, on created_at)
+    """
     if inspections_collection is None:
         return jsonify({'status': 'error', 'message': 'Database not available'}), 500
     
     try:
         import csv
         import io
-        from datetime import datetime
-        
-        # Get all inspections
-        inspections = list(inspections_collection.find().sort('date', -1))
         
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
+        query, error = export_filter_from_args(request.args)
+        if error:
+            return jsonify({'status': 'error', 'message': error}), 400
         
         # Write header row
         headers = [
@@ -1455,28 +2555,22 @@ def export_csv():
             'Engine Oil Added', 'Transmission Fluid Added', 'Comments',
             'Created At', 'Updated At'
         ]
-        writer.writerow(headers)
         
-        # Write data rows
-        for inspection in inspections:
+        def inspection_row(inspection, members):
             # Get inspector info - try to resolve from CAPID if name is missing
             inspector_name = inspection.get('inspector_name', '')
             inspector_id = inspection.get('inspector_id', '')
             
             if not inspector_name and inspector_id:
-                # Try to look up member info from CAPID
-                try:
-                    member_info = find_member_info(inspector_id)
-                    if member_info:
-                        inspector_name = f"{member_info.get('rank', '')} {member_info.get('first_name', '')} {member_info.get('last_name', '')} ({inspector_id})".strip()
-                    else:
-                        inspector_name = f"CAPID {inspector_id}"
-                except:
-                    inspector_name = f"CAPID {inspector_id}" if inspector_id else "Unknown Inspector"
+                member_info = members.get(str(inspector_id))
+                if member_info:
+                    inspector_name = f"{member_info.get('rank', '')} {member_info.get('first_name', '')} {member_info.get('last_name', '')} ({inspector_id})".strip()
+                else:
+                    inspector_name = f"CAPID {inspector_id}"
             elif not inspector_name:
                 inspector_name = "Unknown Inspector"
             
-            row = [
+            return [
                 str(inspection.get('_id', '')),
                 inspection.get('date', ''),
                 inspection.get('time', ''),
@@ -1530,19 +2624,33 @@ def export_csv():
                 inspection.get('created_at', ''),
                 inspection.get('updated_at', '')
             ]
-            writer.writerow(row)
         
-        # Get CSV content
-        csv_content = output.getvalue()
-        output.close()
+        def generate():
+            # Only one batch is ever in memory: rows go out as soon as a batch is written
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(headers)
+            yield output.getvalue()
+            
+            for batch in iter_inspection_batches(query):
+                members = find_members_info(i.get('inspector_id') for i in batch if not i.get('inspector_name'))
+                output.seek(0)
+                output.truncate()
+                for inspection in batch:
+                    writer.writerow(inspection_row(inspection, members))
+                yield output.getvalue()
+        
+        filename_parts = ['inspections' if query else 'all_inspections']
+        if request.args.get('event'):
+            filename_parts.append(secure_filename(request.args['event']))
+        filename_parts.append(datetime.now().strftime("%Y%m%d_%H%M%S"))
         
-        # Create response
-        from flask import Response
         response = Response(
-            csv_content,
+            generate(),
             mimetype='text/csv',
             headers={
-                'Content-Disposition': f'attachment; filename=all_inspections_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+                'Content-Disposition': f'attachment; filename={"_".join(filename_parts)}.csv',
+                'X-Accel-Buffering': 'no'  # let nginx pass the rows through as they come
             }
         )
         return response
@@ -1550,44 +2658,389 @@ def export_csv():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/stats')
+# Typed columnar export for the analysts - built from the fields upload() actually
+# stores. pyarrow is optional and only needed for this export.
+PARQUET_BATCH_SIZE = int(os.getenv('PARQUET_BATCH_SIZE', '10000'))  # rows per row group
+PARQUET_STRING_FIELDS = [
+    'van_number', 'event_name', 'inspector_id', 'license_plate', 'inspection_sticker',
+    'vin_display_hidden', 'comments', 'tire_fl', 'tire_fr', 'tire_rl', 'tire_rr', 'tire_spare',
+    'video_filename', 'converted_video_filename', 'video_status', 'video_location'
+]
+PARQUET_ADDED_FLUID_FIELDS = ['engine_oil', 'transmission_fluid', 'wiper_fluid']  # quarts/gallons added
+
+def parse_number(value):
+    """'62.5%' / '1,234' / 12 -> float, anything unparseable -> None"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(str(value).replace('%', '').replace(',', '').strip())
+    except ValueError:
+        return None
+
+def parse_yes_no(value):
+    return True if value == 'Yes' else False if value == 'No' else None
+
+def parse_true_false(value):
+    """vin_confirmed is stored as the string 'true' / 'false'"""
+    if value is True or value is False:
+        return value
+    value = str(value or '').strip().lower()
+    return True if value == 'true' else False if value == 'false' else None
+
+def parse_inspection_date(value):
+    """The form's Date/Time field (toLocaleString: 'MM/DD/YYYY, HH:MM:SS AM') as a datetime"""
+    if not value:
+        return None
+    for fmt in ('%m/%d/%Y, %I:%M:%S %p', '%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y'):
+        try:
+            return datetime.strptime(str(value).strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+def inspection_parquet_schema():
+    import pyarrow as pa
+    
+    fields = [
+        pa.field('inspection_id', pa.string()),
+        pa.field('inspected_at', pa.timestamp('s')),
+        pa.field('created_at', pa.timestamp('ms')),
+        pa.field('updated_at', pa.timestamp('ms')),
+        pa.field('odometer_in', pa.int64()),
+        pa.field('vin_confirmed', pa.bool_()),
+        pa.field('has_video', pa.bool_())
+    ]
+    fields += [pa.field(f, pa.string()) for f in PARQUET_STRING_FIELDS]
+    fields += [pa.field(f, pa.float64()) for f in PARQUET_ADDED_FLUID_FIELDS]
+    fields += [pa.field(f'{f}_pct', pa.float64()) for f in ARRIVAL_FIELDS]
+    fields += [pa.field(f, pa.bool_()) for f in CHECKLIST_FIELDS]
+    return pa.schema(fields)
+
+def inspection_parquet_row(inspection):
+    """One inspection document -> a dict matching inspection_parquet_schema()"""
+    odometer = parse_number(inspection.get('odometer_in'))
+    row = {
+        'inspection_id': str(inspection['_id']),
+        'inspected_at': parse_inspection_date(inspection.get('date')),
+        'created_at': inspection.get('created_at') if isinstance(inspection.get('created_at'), datetime) else None,
+        'updated_at': inspection.get('updated_at') if isinstance(inspection.get('updated_at'), datetime) else None,
+        'odometer_in': int(odometer) if odometer is not None else None,
+        'vin_confirmed': parse_true_false(inspection.get('vin_confirmed')),
+        'has_video': bool(inspection.get('video_filename'))
+    }
+    for f in PARQUET_STRING_FIELDS:
+        value = inspection.get(f)
+        row[f] = str(value) if value not in (None, '') else None
+    for f in PARQUET_ADDED_FLUID_FIELDS:
+        row[f] = parse_number(inspection.get(f))
+    for f in ARRIVAL_FIELDS:
+        row[f'{f}_pct'] = parse_number(inspection.get(f))
+    for f in CHECKLIST_FIELDS:
+        row[f] = parse_yes_no(inspection.get(f))
+    # Legacy support: if either form_73 or form_132 is "Yes", count it as form_132
+    if inspection.get('form_73') == 'Yes':
+        row['form_132'] = True
+    return row
+
+def write_inspections_parquet(query, sink, columns=None):
+    """Write the inspections matching query to sink (path or binary file object) as
+    zstd Parquet, one row group per batch. Returns the number of rows written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = inspection_parquet_schema()
+    if columns:
+        unknown = [c for c in columns if c not in schema.names]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+        schema = pa.schema([schema.field(c) for c in columns])
+    
+    rows_written = 0
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for batch in iter_inspection_batches(query, batch_size=PARQUET_BATCH_SIZE):
+            rows = [inspection_parquet_row(i) for i in batch]
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            rows_written += len(rows)
+    return rows_written
+
+@app.route('/admin/export/parquet')
 @require_auth
 @require_admin
-def admin_stats():
-    """Get admin dashboard statistics"""
+def export_parquet():
+    """Export inspections as typed Parquet for pandas/Arrow.
+    
+    Same filters as the CSV export (event, van_number, inspector_id, start_date, end_date)
+    plus columns=a,b,c to pick columns
+    """
     if inspections_collection is None:
         return jsonify({'status': 'error', 'message': 'Database not available'}), 500
     
     try:
-        # Total inspections
-        total_inspections = inspections_collection.count_documents({})
-        
-        # Total unique COVs
-        total_covs = len(inspections_collection.distinct('van_number'))
-        
-        # Total unique events
-        total_events = len(inspections_collection.distinct('event_name'))
-        
-        # Videos with actual issues (processing failed, missing, or corrupted)
-        videos_with_issues = inspections_collection.count_documents({
-            '$or': [
-                {'video_status': 'failed'},  # Videos that failed to process
-                {'video_status': 'error'},   # Videos with processing errors
-                {'video_status': {'$exists': False}},  # Videos with no status (likely missing)
-                {'video_filename': {'$exists': True, '$ne': ''}, 'converted_video_filename': {'$exists': False}, 'video_status': {'$ne': 'ready'}}  # Videos that should be converted but aren't ready
-            ]
-        })
+        import tempfile
+        
+        query, error = export_filter_from_args(request.args)
+        if error:
+            return jsonify({'status': 'error', 'message': error}), 400
+        columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()]
+        
+        # Parquet's footer is written last, so spool to a temp file and send that
+        output = tempfile.TemporaryFile()
+        try:
+            write_inspections_parquet(query, output, columns or None)
+        except ValueError as e:
+            output.close()
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        output.seek(0)
+        
+        return send_file(
+            output,
+            mimetype='application/vnd.apache.parquet',
+            as_attachment=True,
+            download_name=f'inspections_{datetime.now().strftime("%Y%m%d_%H%M%S")}.parquet'
+        )
+        
+    except ImportError:
+        return jsonify({
+            'status': 'error', 
+            'message': 'pyarrow library not available. Install with: pip install pyarrow'
+        }), 500
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# Delta export for downstream sync: inspections changed since a watermark, then
+# tombstones for the ones deleted. The window's upper bound trails "now" a little so
+# writes still in flight when a page is read land in the next sync instead of being missed.
+DELTA_PAGE_SIZE = 500
+DELTA_SAFETY_SECONDS = 5
+
+def delta_document(doc):
+    """Inspection document as plain JSON (string ids, isoformat datetimes)"""
+    out = {}
+    for key, value in doc.items():
+        if key == '_id':
+            out['inspection_id'] = str(value)
+        elif isinstance(value, ObjectId):
+            out[key] = str(value)
+        elif isinstance(value, datetime):
+            out[key] = value.isoformat()
+        else:
+            out[key] = value
+    return out
+
+@app.route('/api/admin/export/delta')
+@require_auth
+@require_admin
+def export_delta():
+    """Inspections created, updated or deleted since a watermark.
+    
+    First call: ?since=<ISO datetime> (omit for everything). Keep calling with
+    ?cursor=<next_cursor> while has_more is true, then store `watermark` and pass it
+    as `since` next time.
+    """
+    if inspections_collection is None:
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 500
+    
+    try:
+        limit = max(1, min(int(request.args.get('limit', DELTA_PAGE_SIZE)), 5000))
+        cursor_token = request.args.get('cursor')
         
+        if cursor_token:
+            try:
+                state = decode_page_cursor(cursor_token)
+            except Exception:
+                return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+        else:
+            since = None
+            if request.args.get('since'):
+                try:
+                    since = datetime.fromisoformat(request.args['since'])
+                except ValueError:
+                    return jsonify({'status': 'error', 'message': 'since must be an ISO datetime'}), 400
+            state = {
+                'since': since,
+                'until': datetime.now() - timedelta(seconds=DELTA_SAFETY_SECONDS),
+                'phase': 'changes',
+                'last': None
+            }
+        
+        window = {'$lte': state['until']}
+        if state['since'] is not None:
+            window['$gt'] = state['since']
+        
+        changes = []
+        tombstones = []
+        
+        if state['phase'] == 'changes':
+            query = {'updated_at': window}
+            if state['last']:
+                query = {'$and': [query, keyset_filter([('updated_at', 1), ('_id', 1)], state['last'])]}
+            docs = list(inspections_collection.find(query).sort([('updated_at', 1), ('_id', 1)]).limit(limit + 1))
+            
+            if len(docs) > limit:
+                docs = docs[:limit]
+                state['last'] = [docs[-1]['updated_at'], docs[-1]['_id']]
+            else:
+                # all changes sent - fill the rest of the page with deletions
+                state['phase'] = 'tombstones'
+                state['last'] = None
+            changes = [delta_document(d) for d in docs]
+        
+        if state['phase'] == 'tombstones' and activity_collection is not None and len(changes) < limit:
+            remaining = limit - len(changes)
+            query = {'type': 'inspection_deleted', 'deleted_at': window}
+            if state['last']:
+                query = {'$and': [query, keyset_filter([('deleted_at', 1), ('_id', 1)], state['last'])]}
+            entries = list(activity_collection.find(query).sort([('deleted_at', 1), ('_id', 1)]).limit(remaining + 1))
+            
+            if len(entries) > remaining:
+                entries = entries[:remaining]
+                state['last'] = [entries[-1]['deleted_at'], entries[-1]['_id']]
+            else:
+                state['phase'] = 'done'
+            tombstones = [{
+                'inspection_id': e.get('inspection_id'),
+                'van_number': e.get('van_number'),
+                'event_name': e.get('event_name'),
+                'deleted_at': format_timestamp(e.get('deleted_at'))
+            } for e in entries]
+        elif state['phase'] == 'tombstones' and activity_collection is None:
+            state['phase'] = 'done'
+        
+        has_more = state['phase'] != 'done'
         return jsonify({
-            'total_inspections': total_inspections,
-            'total_covs': total_covs,
-            'total_events': total_events,
-            'videos_with_issues': videos_with_issues
+            'status': 'success',
+            'since': format_timestamp(state['since']),
+            'watermark': state['until'].isoformat(),
+            'changes': changes,
+            'tombstones': tombstones,
+            'has_more': has_more,
+            'next_cursor': encode_page_cursor(state) if has_more else None
         })
         
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# Dashboard counters live in one app_stats document that writes $inc atomically;
+# a periodic full recount corrects any drift
+STATS_RECOUNT_SECONDS = int(os.getenv('STATS_RECOUNT_SECONDS', '3600'))
+
+# Videos with actual issues (processing failed, missing, or corrupted)
+VIDEO_ISSUE_QUERY = {
+    '$or': [
+        {'video_status': 'failed'},  # Videos that failed to process
+        {'video_status': 'error'},   # Videos with processing errors
+        {'video_status': {'$exists': False}},  # Videos with no status (likely missing)
+        {'video_filename': {'$exists': True, '$ne': ''}, 'converted_video_filename': {'$exists': False}, 'video_status': {'$ne': 'ready'}}  # Videos that should be converted but aren't ready
+    ]
+}
+
+def is_video_issue(doc):
+    """1 if an inspection document matches VIDEO_ISSUE_QUERY, else 0"""
+    status = doc.get('video_status')
+    if 'video_status' not in doc or status in ('failed', 'error'):
+        return 1
+    if 'video_filename' in doc and doc['video_filename'] != '' and 'converted_video_filename' not in doc and status != 'ready':
+        return 1
+    return 0
+
+def update_inspection_video(query, fields):
+    """$set fields on one inspection, keeping the video issue counter in step.
+    
+    Returns the document as it was before the update (None if nothing matched)."""
+    before = inspections_collection.find_one_and_update(query, {'$set': {'updated_at': datetime.now(), **fields}})
+    if before is not None:
+        delta = is_video_issue({**before, **fields}) - is_video_issue(before)
+        if delta:
+            adjust_admin_stats(videos_with_issues=delta)
+        invalidate_response_cache(*VIDEO_CACHE_SCOPES)
+    return before
+
+def is_first_event_inspection(event_name):
+    """True if the inspection just inserted is the only one for its event"""
+    return inspections_collection.count_documents({'event_name': event_name}, limit=2) == 1
+
+def is_last_event_inspection(event_name):
+    """True if the inspection just deleted was the last one for its event"""
+    return inspections_collection.count_documents({'event_name': event_name}, limit=1) == 0
+
+def adjust_admin_stats(**deltas):
+    """Atomically bump dashboard counters (no-op until the first recount has created them)"""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas or db is None:
+        return
+    try:
+        db['app_stats'].update_one({'_id': 'admin_stats'}, {'$inc': deltas})
+    except Exception as e:
+        print(f"Error updating admin stats: {e}")
+
+def recount_admin_stats():
+    """Full recount of the dashboard counters - runs on first use and periodically"""
+    stats = {
+        'total_inspections': inspections_collection.count_documents({}),
+        'total_covs': len(inspections_collection.distinct('van_number')),
+        'total_events': len(inspections_collection.distinct('event_name')),
+        'videos_with_issues': inspections_collection.count_documents(VIDEO_ISSUE_QUERY),
+        'recounted_at': datetime.now()
+    }
+    db['app_stats'].replace_one({'_id': 'admin_stats'}, stats, upsert=True)
+    return stats
+
+def start_stats_recount_timer():
+    """Recount the dashboard counters every STATS_RECOUNT_SECONDS in the background"""
+    def run():
+        while True:
+            time.sleep(STATS_RECOUNT_SECONDS)
+            try:
+                if inspections_collection is not None:
+                    recount_admin_stats()
+            except Exception as e:
+                print(f"Error recounting admin stats: {e}")
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+def load_admin_stats():
+    # one primary key read - counters are maintained by the writes
+    stats = db['app_stats'].find_one({'_id': 'admin_stats'})
+    if stats is None:
+        stats = recount_admin_stats()
+    return admin_stats_payload(stats)
+
+def admin_stats_payload(stats):
+    return {
+        'total_inspections': stats.get('total_inspections', 0),
+        'total_covs': stats.get('total_covs', 0),
+        'total_events': stats.get('total_events', 0),
+        'videos_with_issues': stats.get('videos_with_issues', 0)
+    }
+
+@app.route('/api/admin/stats')
+@require_auth
+@require_admin
+def admin_stats():
+    """Get admin dashboard statistics"""
+    if inspections_collection is None:
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 500
+    
+    try:
+        return jsonify(cached_response_value('admin_stats', None, load_admin_stats))
+        
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def get_event_inspection_stats():
+    """Inspection count, ready-video count and last activity for every event, in one $group"""
+    pipeline = [
+        {'$group': {
+            '_id': '$event_name',
+            'inspection_count': {'$sum': 1},
+            'video_ready_count': {'$sum': {'$cond': [{'$eq': ['$video_status', 'ready']}, 1, 0]}},
+            'last_activity': {'$max': {'$ifNull': ['$updated_at', '$created_at']}}
+        }}
+    ]
+    return {row['_id']: row for row in inspections_collection.aggregate(pipeline)}
+
 @app.route('/api/admin/events')
 @require_auth
 @require_admin
@@ -1597,61 +3050,68 @@ def admin_events():
         return jsonify({'status': 'error', 'message': 'Database not available'}), 500
     
     try:
-        # Get all events from the events collection (not from inspections)
-        all_events = list(events_collection.find().sort('name', 1)) if events_collection is not None else []
-        
-        formatted_events = []
-        for event_doc in all_events:
-            event_name = event_doc.get('name', '')
-            if event_name:
-                # Get inspection count for this event
-                inspection_count = inspections_collection.count_documents({'event_name': event_name}) if inspections_collection is not None else 0
-                
-                formatted_events.append({
-                    'name': event_name,
-                    'inspection_count': inspection_count,
-                    'locked': event_doc.get('is_locked', False),
-                    'locked_by': event_doc.get('locked_by', ''),
-                    'locked_at': event_doc.get('locked_at', '')
-                })
-        
         return jsonify({
             'status': 'success',
-            'events': formatted_events
+            'events': cached_response_value('admin_events', None, load_admin_events)
         })
         
     except Exception as e:
         print(f"Error in admin_events: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def load_admin_events():
+    # Get all events from the events collection (not from inspections)
+    all_events = list(events_collection.find().sort('name', 1)) if events_collection is not None else []
+    
+    # counts for every event in one pass instead of a count_documents per event
+    event_stats = get_event_inspection_stats()
+    
+    formatted_events = []
+    for event_doc in all_events:
+        event_name = event_doc.get('name', '')
+        if event_name:
+            stats = event_stats.get(event_name, {})
+            
+            formatted_events.append({
+                'id': str(event_doc['_id']),
+                'name': event_name,
+                'inspection_count': stats.get('inspection_count', 0),
+                'video_ready_count': stats.get('video_ready_count', 0),
+                'last_activity': format_timestamp(stats.get('last_activity')),
+                'locked': event_doc.get('is_locked', False),
+                'locked_by': event_doc.get('locked_by', ''),
+                'locked_at': format_timestamp(event_doc.get('locked_at')) or ''
+            })
+    return formatted_events
+
 @app.route('/api/admin/events/<event_name>/lock', methods=['POST'])
 @require_auth
 @require_admin
 def lock_event(event_name):
     """Lock an event to prevent new inspections"""
-    if inspections_collection is None:
+    if events_collection is None:
         return jsonify({'status': 'error', 'message': 'Database not available'}), 500
     
     try:
-        from datetime import datetime
-        
-        # Update all inspections with this event name
-        result = inspections_collection.update_many(
-            {'event_name': event_name},
+        # The lock is one field on the event document, not a copy on every inspection
+        result = events_collection.update_one(
+            {'name': event_name},
             {
                 '$set': {
-                    'event_locked': True,
-                    'event_locked_by': session.get('capid', 'Unknown'),
-                    'event_locked_at': datetime.now().isoformat()
+                    'is_locked': True,
+                    'locked_by': session.get('capid', 'Unknown'),
+                    'locked_at': datetime.now()
                 }
             }
         )
         
-        if result.modified_count > 0:
+        if result.matched_count > 0:
+            invalidate_event_locks()
+            bump_data_version('events')
+            invalidate_response_cache(*EVENT_CACHE_SCOPES)
+            
             # Log the lock activity
             try:
-                from datetime import datetime
-                
                 # Get full user info for the person doing the lock
                 locked_by_capid = session.get('capid', 'Unknown')
                 locked_by_name = 'Unknown'
@@ -1673,8 +3133,7 @@ def lock_event(event_name):
                     'locked_at': datetime.now(),
                     'timestamp': datetime.now().isoformat()
                 }
-                if activity_collection is not None:
-                    activity_collection.insert_one(activity_log)
+                log_activity(activity_log)
             except Exception as e:
                 print(f"Error logging lock activity: {e}")
             
@@ -1686,7 +3145,7 @@ def lock_event(event_name):
         else:
             return jsonify({
                 'status': 'error',
-                'message': f'No inspections found for event "{event_name}"'
+                'message': f'Event "{event_name}" not found'
             }), 404
             
     except Exception as e:
@@ -1697,26 +3156,25 @@ def lock_event(event_name):
 @require_admin
 def unlock_event(event_name):
     """Unlock an event to allow new inspections"""
-    if inspections_collection is None:
+    if events_collection is None:
         return jsonify({'status': 'error', 'message': 'Database not available'}), 500
     
     try:
-        # Update all inspections with this event name
-        result = inspections_collection.update_many(
-            {'event_name': event_name},
+        result = events_collection.update_one(
+            {'name': event_name},
             {
-                '$unset': {
-                    'event_locked': '',
-                    'event_locked_by': '',
-                    'event_locked_at': ''
-                }
+                '$set': {'is_locked': False},
+                '$unset': {'locked_by': '', 'locked_at': ''}
             }
         )
         
-        if result.modified_count > 0:
+        if result.matched_count > 0:
+            invalidate_event_locks()
+            bump_data_version('events')
+            invalidate_response_cache(*EVENT_CACHE_SCOPES)
+            
             # Log the unlock activity
             try:
-                from datetime import datetime
                 # Get full user info for the person doing the unlock
                 unlocked_by_capid = session.get('capid', 'Unknown')
                 unlocked_by_name = 'Unknown'
@@ -1738,8 +3196,7 @@ def unlock_event(event_name):
                     'unlocked_at': datetime.now(),
                     'timestamp': datetime.now().isoformat()
                 }
-                if activity_collection is not None:
-                    activity_collection.insert_one(activity_log)
+                log_activity(activity_log)
             except Exception as e:
                 print(f"Error logging unlock activity: {e}")
             
@@ -1751,7 +3208,7 @@ def unlock_event(event_name):
         else:
             return jsonify({
                 'status': 'error',
-                'message': f'No inspections found for event "{event_name}"'
+                'message': f'Event "{event_name}" not found'
             }), 404
             
     except Exception as e:
@@ -1761,42 +3218,15 @@ def unlock_event(event_name):
 @require_auth
 def get_event_lock_status(event_name):
     """Check if an event is locked"""
-    if inspections_collection is None:
-        return jsonify({'status': 'error', 'message': 'Database not available'}), 500
-    
     try:
-        # Find any inspection for this event to check lock status
-        inspection = inspections_collection.find_one({'event_name': event_name})
-        
-        if not inspection:
-            return jsonify({
-                'status': 'success',
-                'event_name': event_name,
-                'is_locked': False,
-                'locked_by': None,
-                'locked_at': None
-            })
-        
-        is_locked = inspection.get('event_locked', False)
-        locked_by = inspection.get('event_locked_by')
-        locked_at = inspection.get('event_locked_at')
-        
-        # Handle locked_at field - it might be a string or datetime object
-        locked_at_str = None
-        if locked_at:
-            if hasattr(locked_at, 'isoformat'):
-                # It's a datetime object
-                locked_at_str = locked_at.isoformat()
-            else:
-                # It's already a string
-                locked_at_str = str(locked_at)
+        lock = get_event_lock(event_name)
         
         return jsonify({
             'status': 'success',
             'event_name': event_name,
-            'is_locked': is_locked,
-            'locked_by': locked_by,
-            'locked_at': locked_at_str
+            'is_locked': lock is not None,
+            'locked_by': lock.get('locked_by') if lock else None,
+            'locked_at': format_timestamp(lock.get('locked_at')) if lock else None
         })
         
     except Exception as e:
@@ -1863,53 +3293,187 @@ def admin_access_info():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# Activity log entries carry a real datetime (logged_at) plus normalized actor/events
+# fields, so the log can be filtered and paged off indexes whatever the entry type
+ACTIVITY_ACTOR_FIELDS = {
+    'inspection_deleted': 'deleted_by',
+    'event_deleted': 'deleted_by',
+    'event_locked': 'locked_by',
+    'event_unlocked': 'unlocked_by',
+    'events_merged': 'merged_by'
+}
+ACTIVITY_PAGE_SIZE = 50
+
+def activity_events(entry):
+    """Event names an activity entry is about"""
+    names = [entry.get('event_name'), entry.get('source_event'), entry.get('target_event')]
+    return [name for name in names if name]
+
+def log_activity(entry):
+    """Write one activity log entry, filling in logged_at / actor / events"""
+    if activity_collection is None:
+        return
+    now = datetime.now()
+    entry.setdefault('logged_at', now)
+    entry.setdefault('timestamp', now.isoformat())
+    actor_field = ACTIVITY_ACTOR_FIELDS.get(entry.get('type'))
+    if actor_field and 'actor' not in entry:
+        entry['actor'] = entry.get(actor_field)
+        entry['actor_name'] = entry.get(f'{actor_field}_name')
+    entry.setdefault('events', activity_events(entry))
+    activity_collection.insert_one(entry)
+    invalidate_response_cache('recent_activity')
+
+def activity_actor_name(activity):
+    name = activity.get('actor_name')
+    if not name or name == 'Unknown':
+        # Fallback to CAPID if name not stored
+        actor = activity.get('actor', 'Unknown')
+        name = f"CAPID {actor}" if actor and actor != 'Unknown' else 'Unknown'
+    return name
+
+def describe_activity(activity):
+    """One line of text for any activity log entry"""
+    activity_type = activity.get('type', '')
+    by = activity_actor_name(activity)
+    if activity_type == 'inspection_deleted':
+        return f"COV {activity.get('van_number', 'Unknown COV')} inspection deleted from {activity.get('event_name', 'Unknown Event')} by {by}"
+    if activity_type == 'event_locked':
+        return f"Event '{activity.get('event_name', 'Unknown Event')}' locked by {by}"
+    if activity_type == 'event_unlocked':
+        return f"Event '{activity.get('event_name', 'Unknown Event')}' unlocked by {by}"
+    if activity_type == 'events_merged':
+        return f"Event '{activity.get('source_event', 'Unknown')}' merged into '{activity.get('target_event', 'Unknown')}' ({activity.get('inspections_moved', 0)} inspections) by {by}"
+    if activity_type == 'event_deleted':
+        return f"Event '{activity.get('event_name', 'Unknown Event')}' deleted by {by}"
+    if activity_type == 'videos_reconciled':
+        return f"Video locations reconciled: {activity.get('inspections_checked', 0)} checked, {activity.get('discrepancy_count', 0)} discrepancies, {activity.get('repaired', 0)} repaired"
+    return f"{activity_type or 'Unknown'} activity"
+
+def activity_filter_from_args(args):
+    """Activity log query from type (comma separated) / user / event / start / end args.
+    Returns (query, error message)"""
+    query = {}
+    types = [t.strip() for t in args.get('type', '').split(',') if t.strip()]
+    if types:
+        query['type'] = types[0] if len(types) == 1 else {'$in': types}
+    if args.get('user'):
+        query['actor'] = args['user']
+    if args.get('event'):
+        query['events'] = args['event']
+    
+    logged_at = {}
+    try:
+        if args.get('start'):
+            logged_at['$gte'] = datetime.fromisoformat(args['start'])
+        if args.get('end'):
+            end = datetime.fromisoformat(args['end'])
+            if len(args['end']) == 10:
+                logged_at['$lt'] = end + timedelta(days=1)  # a bare date means the whole day
+            else:
+                logged_at['$lte'] = end
+    except ValueError:
+        return None, 'start/end must be ISO dates (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)'
+    if logged_at:
+        query['logged_at'] = logged_at
+    return query, None
+
+def activity_document(activity):
+    """Activity log entry as plain JSON"""
+    out = {'id': str(activity['_id']), 'description': describe_activity(activity)}
+    for key, value in activity.items():
+        if key == '_id':
+            continue
+        out[key] = value.isoformat() if isinstance(value, datetime) else str(value) if isinstance(value, ObjectId) else value
+    return out
+
+@app.route('/api/admin/activity')
+@require_auth
+@require_admin
+def query_activity():
+    """Filtered, keyset-paginated activity log (newest first).
+    
+    Filters: type=a,b  user=<capid>  event=<name>  start/end=<ISO date or datetime>
+    Paging: limit (max 200) and cursor=<next_cursor from the previous page>
+    """
+    if activity_collection is None:
+        return jsonify({'status': 'error', 'message': 'Activity collection not available'}), 500
+    
+    try:
+        query, error = activity_filter_from_args(request.args)
+        if error:
+            return jsonify({'status': 'error', 'message': error}), 400
+        limit = max(1, min(int(request.args.get('limit', ACTIVITY_PAGE_SIZE)), 200))
+        sort_criteria = [('logged_at', -1), ('_id', -1)]
+        
+        if request.args.get('cursor'):
+            try:
+                last_values = decode_page_cursor(request.args['cursor'])
+                if not isinstance(last_values, list) or len(last_values) != len(sort_criteria):
+                    raise ValueError('bad cursor')
+            except Exception:
+                return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+            query = {'$and': [query, keyset_filter(sort_criteria, last_values)]}
+        
+        entries = list(activity_collection.find(query).sort(sort_criteria).limit(limit + 1))
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        
+        return jsonify({
+            'status': 'success',
+            'activities': [activity_document(a) for a in entries],
+            'has_more': has_more,
+            'next_cursor': encode_page_cursor([entries[-1].get('logged_at'), entries[-1]['_id']]) if has_more else None
+        })
+        
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/admin/export-activity')
 @require_auth
 @require_admin
 def export_activity():
-    """Export activity log as CSV - admin only"""
+    """Export activity log as CSV - admin only. Takes the same filters as /api/admin/activity"""
     try:
+        import csv
+        import io
+        
         if activity_collection is None:
             return jsonify({'status': 'error', 'message': 'Activity collection not available'}), 500
         
-        # Get all activity log entries
-        activities = list(activity_collection.find().sort('timestamp', -1))
+        query, error = activity_filter_from_args(request.args)
+        if error:
+            return jsonify({'status': 'error', 'message': error}), 400
         
-        # Create CSV content
-        csv_content = "Timestamp,Type,Description\n"
-        for activity in activities:
-            timestamp = activity.get('timestamp', '')
-            activity_type = activity.get('type', '')
+        def generate():
+            output = io.StringIO()
+            writer = csv.writer(output, quoting=csv.QUOTE_ALL)
+            writer.writerow(['Timestamp', 'Type', 'User', 'Event', 'Description'])
             
-            # Create description based on type
-            if activity_type == 'inspection_deleted':
-                van_number = activity.get('van_number', 'Unknown')
-                event_name = activity.get('event_name', 'Unknown')
-                deleted_by = activity.get('deleted_by_name', activity.get('deleted_by', 'Unknown'))
-                description = f"COV {van_number} inspection deleted from {event_name} by {deleted_by}"
-            elif activity_type == 'event_locked':
-                event_name = activity.get('event_name', 'Unknown')
-                locked_by = activity.get('locked_by_name', activity.get('locked_by', 'Unknown'))
-                description = f"Event '{event_name}' locked by {locked_by}"
-            elif activity_type == 'event_unlocked':
-                event_name = activity.get('event_name', 'Unknown')
-                unlocked_by = activity.get('unlocked_by_name', activity.get('unlocked_by', 'Unknown'))
-                description = f"Event '{event_name}' unlocked by {unlocked_by}"
-            else:
-                description = f"Unknown activity: {activity_type}"
-            
-            # Escape CSV values
-            timestamp = timestamp.replace('"', '""')
-            activity_type = activity_type.replace('"', '""')
-            description = description.replace('"', '""')
-            
-            csv_content += f'"{timestamp}","{activity_type}","{description}"\n'
+            cursor = activity_collection.find(query).sort([('logged_at', -1), ('_id', -1)]).batch_size(EXPORT_BATCH_SIZE)
+            try:
+                for count, activity in enumerate(cursor, 1):
+                    writer.writerow([
+                        format_timestamp(activity.get('logged_at')) or activity.get('timestamp', ''),
+                        activity.get('type', ''),
+                        activity_actor_name(activity) if activity.get('actor') else '',
+                        ', '.join(activity.get('events') or activity_events(activity)),
+                        describe_activity(activity)
+                    ])
+                    if count % EXPORT_BATCH_SIZE == 0:
+                        yield output.getvalue()
+                        output.seek(0)
+                        output.truncate()
+                yield output.getvalue()
+            finally:
+                cursor.close()
         
         return Response(
-            csv_content,
+            generate(),
             mimetype='text/csv',
             headers={
-                'Content-Disposition': f'attachment; filename=activity_log_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+                'Content-Disposition': f'attachment; filename=activity_log_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+                'X-Accel-Buffering': 'no'
             }
         )
         
@@ -1971,6 +3535,13 @@ def system_info():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/admin/cache-stats')
+@require_auth
+@require_admin
+def cache_stats():
+    """Response cache hit rates for this server process"""
+    return jsonify({'status': 'success', **response_cache_metrics()})
+
 @app.route('/api/admin/events/<event_name>', methods=['DELETE'])
 @require_auth
 @require_admin
@@ -2000,6 +3571,10 @@ def delete_event(event_name):
         if result.deleted_count == 0:
             return jsonify({'status': 'error', 'message': 'Event not found'}), 404
         
+        bump_data_version('events')
+        invalidate_event_locks()
+        invalidate_response_cache(*EVENT_CACHE_SCOPES)
+        
         # Log the deletion activity
         try:
             from datetime import datetime
@@ -2020,8 +3595,7 @@ def delete_event(event_name):
                 'deleted_at': datetime.now(),
                 'timestamp': datetime.now().isoformat()
             }
-            if activity_collection is not None:
-                activity_collection.insert_one(activity_log)
+            log_activity(activity_log)
         except Exception as e:
             pass
         
@@ -2033,6 +3607,13 @@ def delete_event(event_name):
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def supports_transactions():
+    """Multi-document transactions need a replica set or sharded cluster"""
+    try:
+        return client is not None and client.topology_description.topology_type_name in ('ReplicaSetWithPrimary', 'Sharded')
+    except Exception:
+        return False
+
 @app.route('/api/admin/merge-events', methods=['POST'])
 @require_auth
 @require_admin
@@ -2054,6 +3635,16 @@ def merge_events():
         target_event_doc = events_collection.find_one({'name': target_event}) if events_collection is not None else None
         
         if not source_event_doc:
+            # a retry of a merge that already finished is fine
+            already_merged = activity_collection is not None and activity_collection.find_one(
+                {'type': 'events_merged', 'source_event': source_event, 'target_event': target_event}
+            )
+            if already_merged and inspections_collection.count_documents({'event_name': source_event}, limit=1) == 0:
+                return jsonify({
+                    'status': 'success',
+                    'message': f'"{source_event}" was already merged into "{target_event}".',
+                    'report': {'already_merged': True, 'moved': 0}
+                })
             return jsonify({'status': 'error', 'message': f'Source event "{source_event}" not found'}), 404
         
         if not target_event_doc:
@@ -2063,28 +3654,71 @@ def merge_events():
         if target_event_doc.get('is_locked', False):
             return jsonify({'status': 'error', 'message': f'Cannot merge into locked event "{target_event}"'}), 400
         
-        # Get all inspections from source event
-        source_inspections = list(inspections_collection.find({'event_name': source_event})) if inspections_collection is not None else []
+        merging_into = source_event_doc.get('merging_into')
+        if merging_into and merging_into != target_event:
+            return jsonify({'status': 'error', 'message': f'"{source_event}" is already being merged into "{merging_into}"'}), 409
         
-        if not source_inspections:
+        source_count = inspections_collection.count_documents({'event_name': source_event}) if inspections_collection is not None else 0
+        
+        # an unfinished merge (marked on the source event) may have moved everything already
+        if not source_count and not merging_into:
             return jsonify({'status': 'error', 'message': f'No inspections found in source event "{source_event}"'}), 400
         
-        # Update all inspections to use target event
-        updated_count = 0
-        for inspection in source_inspections:
-            inspections_collection.update_one(
-                {'_id': inspection['_id']},
-                {'$set': {'event_name': target_event}}
+        # What the merge changes is worked out once and saved on the source event with the
+        # merging_into marker. A retry after a partial failure finds the inspections already
+        # moved, so it finishes from the saved plan instead of recomputing from an empty source.
+        plan = source_event_doc.get('merge_plan') if merging_into else None
+        if plan is None:
+            plan = {
+                'source_count': source_count,
+                'covs': inspections_collection.distinct('van_number', {'event_name': source_event}),
+                # merging into an event that had no inspections yet doesn't change the event total
+                'target_had_inspections': inspections_collection.count_documents({'event_name': target_event}, limit=1) > 0,
+                'stats_adjusted': False
+            }
+            # mark the merge as started so a retry after a failure knows to finish it
+            events_collection.update_one({'name': source_event}, {'$set': {'merging_into': target_event, 'merge_plan': plan}})
+        
+        def run_merge(mongo_session=None):
+            # one update_many moves every inspection; it only matches what's still in the
+            # source event, so running it again after a partial failure is harmless
+            return inspections_collection.update_many(
+                {'event_name': source_event},
+                {'$set': {'event_name': target_event, 'updated_at': datetime.now()}},
+                session=mongo_session
             )
-            updated_count += 1
         
-        # Delete the source event
-        events_collection.delete_one({'name': source_event})
+        transactional = supports_transactions()
+        if transactional:
+            with client.start_session() as mongo_session:
+                moved = mongo_session.with_transaction(lambda s: run_merge(s))
+        else:
+            moved = run_merge()
+        updated_count = moved.modified_count
+        
+        # derived data from the saved plan, then drop the source event (and its marker) last
+        refresh_cov_summary(plan['covs'])
+        if plan['target_had_inspections'] and plan['source_count'] and not plan.get('stats_adjusted'):
+            adjust_admin_stats(total_events=-1)
+            events_collection.update_one({'name': source_event}, {'$set': {'merge_plan.stats_adjusted': True}})
+        deleted = events_collection.delete_one({'name': source_event})
+        
+        invalidate_event_locks()
+        bump_data_version('events')
+        invalidate_response_cache(*INSPECTION_CACHE_SCOPES)
+        
+        merge_report = {
+            'source_inspections': plan['source_count'],
+            'matched': moved.matched_count,
+            'moved': updated_count,
+            'covs_affected': len(plan['covs']),
+            'source_event_deleted': deleted.deleted_count > 0,
+            'transactional': transactional,
+            'resumed': bool(merging_into)
+        }
         
         # Log the merge activity
         try:
-            from datetime import datetime
-            
             # Get full user info for the person doing the merge
             merged_by_capid = session.get('capid', 'Unknown')
             merged_by_name = 'Unknown'
@@ -2108,19 +3742,391 @@ def merge_events():
                 'merged_at': datetime.now(),
                 'timestamp': datetime.now().isoformat()
             }
-            if activity_collection is not None:
-                activity_collection.insert_one(activity_log)
+            log_activity(activity_log)
         except Exception as e:
             print(f"Error logging merge activity: {e}")
         
         return jsonify({
             'status': 'success',
-            'message': f'Successfully merged "{source_event}" into "{target_event}". {updated_count} inspections moved.'
+            'message': f'Successfully merged "{source_event}" into "{target_event}". {updated_count} inspections moved.',
+            'report': merge_report
         })
         
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# $group/$project that turns inspections into one summary row per COV - used for the
+# full rebuild and for refreshing a single COV after a write
+COV_SUMMARY_STAGES = [
+    {
+        '$group': {
+            '_id': '$van_number',
+            'total_inspections': {'$sum': 1},
+            'events': {'$addToSet': '$event_name'},
+            'last_inspection': {'$max': '$created_at'},
+            'first_inspection': {'$min': '$created_at'},
+            'inspectors': {'$addToSet': '$inspector_id'}
+        }
+    },
+    {
+        '$project': {
+            'cov_number': '$_id',
+            'total_inspections': 1,
+            'event_count': {'$size': '$events'},
+            'events': 1,
+            'last_inspection': 1,
+            'first_inspection': 1,
+            'inspector_count': {'$size': '$inspectors'},
+            'inspectors': 1
+        }
+    }
+]
+
+def refresh_cov_summary(van_numbers):
+    """Recompute the cov_summary rows for the given COVs from their inspections.
+    
+    Only touches those COVs' inspections (van_number index), so it's cheap to call
+    after every upload, delete or merge."""
+    if cov_summary_collection is None:
+        return
+    if isinstance(van_numbers, str):
+        van_numbers = [van_numbers]
+    
+    try:
+        for van_number in set(van_numbers):
+            rows = list(inspections_collection.aggregate([{'$match': {'van_number': van_number}}] + COV_SUMMARY_STAGES))
+            if rows:
+                result = cov_summary_collection.replace_one({'_id': van_number}, rows[0], upsert=True)
+                if result.upserted_id is not None:
+                    adjust_admin_stats(total_covs=1)
+            else:
+                result = cov_summary_collection.delete_one({'_id': van_number})
+                if result.deleted_count:
+                    adjust_admin_stats(total_covs=-1)
+    except Exception as e:
+        print(f"Error refreshing COV summary for {van_numbers}: {e}")
+
+def rebuild_cov_summary():
+    """Rebuild the whole cov_summary collection from inspections (backfills / drift repair)"""
+    # $out swaps the collection in atomically and keeps its indexes
+    inspections_collection.aggregate(COV_SUMMARY_STAGES + [{'$out': 'cov_summary'}], allowDiskUse=True)
+    count = cov_summary_collection.estimated_document_count()
+    return f"rebuilt cov_summary ({count} COVs)"
+
+@app.cli.command('rebuild-cov-summary')
+def rebuild_cov_summary_command():
+    """Rebuild the per-COV summary collection:  flask --app cov_web rebuild-cov-summary"""
+    print(f"✓ {rebuild_cov_summary()}")
+
+# Declarative index schema - bump INDEX_SCHEMA_VERSION whenever INDEX_SPECS or
+# SCHEMA_MIGRATIONS change and every worker brings the database up to date at startup
+INDEX_SCHEMA_VERSION = 7
+
+INDEX_SPECS = {
+    'inspections': [
+        # inspected_vans (newest first, optionally per event), admin_recent_activity
+        # inspected_vans sorts end in _id so keyset pagination walks the index
+        {'name': 'created_at_id', 'keys': [('created_at', -1), ('_id', -1)]},
+        {'name': 'created_at_van_number', 'keys': [('created_at', -1), ('van_number', 1), ('_id', 1)]},
+        {'name': 'event_name_created_at', 'keys': [('event_name', 1), ('created_at', -1), ('_id', -1)]},
+        # get_cov_inspections, inspected_vans van sorts, admin_stats distinct COVs
+        {'name': 'van_number_created_at', 'keys': [('van_number', 1), ('created_at', -1), ('_id', -1)]},
+        {'name': 'van_number_inspector_created_at', 'keys': [('van_number', 1), ('inspector_id', 1), ('created_at', -1), ('_id', -1)]},
+        {'name': 'inspector_id', 'keys': [('inspector_id', 1)]},
+        # serve_video, attach_video, thumbnail source lookup
+        {'name': 'video_filename', 'keys': [('video_filename', 1)]},
+        # missing_videos - only inspections without a video, covers the whole query
+        {'name': 'missing_videos', 'keys': [('video_filename', 1), ('van_number', 1), ('inspector_id', 1)],
+         'options': {'partialFilterExpression': {'video_filename': ''}}},
+        # admin_stats video issue count
+        {'name': 'video_status', 'keys': [('video_status', 1)]},
+        # delta export walks changes in updated_at order
+        {'name': 'updated_at_id', 'keys': [('updated_at', 1), ('_id', 1)]},
+        # batch / retried uploads - one inspection per client idempotency key
+        {'name': 'idempotency_key', 'keys': [('idempotency_key', 1)],
+         'options': {'unique': True, 'partialFilterExpression': {'idempotency_key': {'$type': 'string'}}}}
+    ],
+    'events': [
+        {'name': 'name', 'keys': [('name', 1)], 'options': {'unique': True}},
+        {'name': 'canonical_name', 'keys': [('canonical_name', 1)]},
+        {'name': 'is_locked', 'keys': [('is_locked', 1)]}
+    ],
+    'users': [
+        {'name': 'capid', 'keys': [('capid', 1)], 'options': {'unique': True}},
+        {'name': 'email', 'keys': [('email', 1)], 'options': {'unique': True}}
+    ],
+    'cov_summary': [
+        # /api/covs sort keys (cov_number itself is the _id)
+        {'name': 'cov_number', 'keys': [('cov_number', 1)]},
+        {'name': 'total_inspections', 'keys': [('total_inspections', 1), ('cov_number', 1)]},
+        {'name': 'last_inspection', 'keys': [('last_inspection', 1), ('cov_number', 1)]},
+        {'name': 'first_inspection', 'keys': [('first_inspection', 1), ('cov_number', 1)]},
+        {'name': 'event_count', 'keys': [('event_count', 1), ('cov_number', 1)]},
+        {'name': 'inspector_count', 'keys': [('inspector_count', 1), ('cov_number', 1)]}
+    ],
+    'activity_log': [
+        # activity query API / export / recent activity - newest first, optionally filtered
+        {'name': 'logged_at_id', 'keys': [('logged_at', -1), ('_id', -1)]},
+        {'name': 'type_logged_at', 'keys': [('type', 1), ('logged_at', -1), ('_id', -1)]},
+        {'name': 'actor_logged_at', 'keys': [('actor', 1), ('logged_at', -1), ('_id', -1)]},
+        {'name': 'events_logged_at', 'keys': [('events', 1), ('logged_at', -1), ('_id', -1)]},
+        # delta export tombstones
+        {'name': 'inspection_tombstones', 'keys': [('deleted_at', 1), ('_id', 1)],
+         'options': {'partialFilterExpression': {'type': 'inspection_deleted'}}}
+    ]
+}
+
+# indexes older versions (or initialize-database) created that the specs above replace
+RETIRED_INDEXES = {
+    'inspections': ['van_number_1', 'event_name_1', 'created_at_-1', 'inspector_id_1'],
+    'events': ['name_1', 'is_locked_1'],
+    'users': ['capid_1', 'email_1'],
+    'activity_log': ['timestamp_-1', 'type_1', 'timestamp', 'type']
+}
+
+def normalize_missing_video_filenames():
+    """Old records store no video as null or leave the field off - make them all '' so the
+    partial missing_videos index covers them"""
+    result = inspections_collection.update_many(
+        {'video_filename': None},
+        {'$set': {'video_filename': ''}}
+    )
+    return f"normalized video_filename on {result.modified_count} inspection(s)"
+
+def move_event_locks_to_events():
+    """Locks used to be copied onto every inspection as event_locked* - move them onto the
+    event documents and drop the copies"""
+    moved = 0
+    locked = inspections_collection.aggregate([
+        {'$match': {'event_locked': True}},
+        {'$group': {
+            '_id': '$event_name',
+            'locked_by': {'$max': '$event_locked_by'},
+            'locked_at': {'$max': '$event_locked_at'}
+        }}
+    ])
+    for event in locked:
+        locked_at = event.get('locked_at')
+        if isinstance(locked_at, str):
+            try:
+                locked_at = datetime.fromisoformat(locked_at)
+            except ValueError:
+                pass
+        result = events_collection.update_one(
+            {'name': event['_id']},
+            {'$set': {'is_locked': True, 'locked_by': event.get('locked_by'), 'locked_at': locked_at}}
+        )
+        moved += result.modified_count
+    cleared = inspections_collection.update_many(
+        {'event_locked': {'$exists': True}},
+        {'$unset': {'event_locked': '', 'event_locked_by': '', 'event_locked_at': ''}}
+    )
+    invalidate_event_locks()
+    bump_data_version('events')
+    return f"moved {moved} event lock(s) onto events, cleared {cleared.modified_count} inspection(s)"
+
+def backfill_updated_at():
+    """Records from before updated_at was kept on every write get their created_at"""
+    result = inspections_collection.update_many(
+        {'updated_at': {'$exists': False}},
+        [{'$set': {'updated_at': '$created_at'}}]
+    )
+    return f"backfilled updated_at on {result.modified_count} inspection(s)"
+
+def backfill_activity_fields():
+    """Older activity entries only have a string timestamp and a type-specific
+    *_by field - give them logged_at / actor / events like log_activity does"""
+    operations = []
+    for entry in activity_collection.find({'logged_at': {'$exists': False}}):
+        logged_at = entry.get('deleted_at') or entry.get('locked_at') or entry.get('unlocked_at') or entry.get('merged_at')
+        if not isinstance(logged_at, datetime):
+            try:
+                logged_at = datetime.fromisoformat(str(entry.get('timestamp', '')).replace('Z', '+00:00')).replace(tzinfo=None)
+            except ValueError:
+                logged_at = entry['_id'].generation_time.replace(tzinfo=None)
+        fields = {'logged_at': logged_at, 'events': activity_events(entry)}
+        actor_field = ACTIVITY_ACTOR_FIELDS.get(entry.get('type'))
+        if actor_field:
+            fields['actor'] = entry.get(actor_field)
+            fields['actor_name'] = entry.get(f'{actor_field}_name')
+        operations.append(UpdateOne({'_id': entry['_id']}, {'$set': fields}))
+    if operations:
+        activity_collection.bulk_write(operations, ordered=False)
+    return f"backfilled logged_at on {len(operations)} activity entr(ies)"
+
+# one-time data fixes, keyed by the schema version that introduced them
+MISSING_VIDEOS_NORMALIZED_VERSION = 1  # schema version of normalize_missing_video_filenames
+
+SCHEMA_MIGRATIONS = {
+    1: [normalize_missing_video_filenames],
+    3: [rebuild_cov_summary],
+    4: [move_event_locks_to_events],
+    5: [backfill_updated_at],
+    6: [backfill_activity_fields]
+}
+
+# the query shapes the hot endpoints actually run, checked with explain() after every migration
+HOT_QUERIES = [
+    ('inspected_vans', 'inspections', {}, [('created_at', -1), ('_id', -1)], None),
+    ('inspected_vans (event)', 'inspections', {'event_name': ''}, [('created_at', -1), ('_id', -1)], None),
+    ('inspected_vans (van_date)', 'inspections', {}, [('van_number', 1), ('created_at', -1), ('_id', -1)], None),
+    ('inspected_vans (date_van)', 'inspections', {}, [('created_at', -1), ('van_number', 1), ('_id', 1)], None),
+    ('get_cov_inspections', 'inspections', {'van_number': ''}, [('created_at', -1)], None),
+    ('serve_video', 'inspections', {'video_filename': 'x.mp4'}, None, None),
+    ('missing_videos', 'inspections', {'video_filename': ''}, None, {'van_number': 1, 'inspector_id': 1, '_id': 0}),
+    ('admin_stats (video issues)', 'inspections', {'video_status': 'failed'}, None, None),
+    ('events', 'events', {}, [('name', 1)], None),
+    ('api_covs', 'cov_summary', {}, [('last_inspection', -1), ('cov_number', -1)], None),
+    ('recent activity', 'activity_log', {}, [('logged_at', -1), ('_id', -1)], None),
+    ('activity (type)', 'activity_log', {'type': 'event_locked'}, [('logged_at', -1), ('_id', -1)], None),
+    ('activity (event)', 'activity_log', {'events': ''}, [('logged_at', -1), ('_id', -1)], None),
+    ('delta export', 'inspections', {'updated_at': {'$gt': datetime(2000, 1, 1)}}, [('updated_at', 1), ('_id', 1)], None),
+    ('delta tombstones', 'activity_log', {'type': 'inspection_deleted', 'deleted_at': {'$gt': datetime(2000, 1, 1)}}, [('deleted_at', 1), ('_id', 1)], None)
+]
+
+def plan_stages(plan):
+    """All stage names in an explain() plan tree"""
+    stages = []
+    if not isinstance(plan, dict):
+        return stages
+    if 'stage' in plan:
+        stages.append(plan['stage'])
+    for key in ('queryPlan', 'inputStage'):
+        stages.extend(plan_stages(plan.get(key)))
+    for child in plan.get('inputStages', []):
+        stages.extend(plan_stages(child))
+    return stages
+
+def check_hot_query_plans():
+    """Explain each hot query and report any that scan the collection or sort in memory"""
+    problems = []
+    for name, collection_name, query, sort, projection in HOT_QUERIES:
+        try:
+            cursor = db[collection_name].find(query, projection).limit(1)
+            if sort:
+                cursor = cursor.sort(sort)
+            stages = plan_stages(cursor.explain().get('queryPlanner', {}).get('winningPlan', {}))
+            if 'COLLSCAN' in stages or 'SORT' in stages:
+                problems.append({'query': name, 'collection': collection_name, 'stages': stages})
+                print(f"⚠️ Hot query '{name}' is not using an index: {' <- '.join(stages)}")
+        except Exception as e:
+            problems.append({'query': name, 'collection': collection_name, 'error': str(e)})
+    return problems
+
+INDEX_OPTION_FIELDS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds')
+
+def index_matches(info, keys, options):
+    """True if an existing index (index_information entry) has exactly these keys and options"""
+    if [tuple(k) for k in info['key']] != [tuple(k) for k in keys]:
+        return False
+    return all(info.get(opt) == options.get(opt) for opt in INDEX_OPTION_FIELDS)
+
+def apply_index_specs(collection, specs, retired):
+    """Create/replace indexes on one collection so they match the specs.
+    
+    An index that already matches a spec under an older name is kept as it is: the same
+    keys can't be indexed twice, and dropping it to rebuild under the new name would leave
+    a unique constraint unenforced in between (and workers starting together race on it).
+    Retired indexes are only dropped when no spec relies on them."""
+    changes = []
+    existing = collection.index_information()
+    kept = set()
+    
+    for spec in specs:
+        keys = spec['keys']
+        options = spec.get('options', {})
+        equivalent = [name for name, info in existing.items() if index_matches(info, keys, options)]
+        if equivalent:
+            kept.update(equivalent)
+            continue
+        
+        if spec['name'] in existing:
+            # same name, different definition - the name has to be freed before rebuilding
+            collection.drop_index(spec['name'])
+            changes.append(f"dropped {collection.name}.{spec['name']} (definition changed)")
+            del existing[spec['name']]
+        
+        # an index on the same keys with other options would clash with ours
+        for other_name, other in list(existing.items()):
+            if other_name != '_id_' and [tuple(k) for k in other['key']] == [tuple(k) for k in keys]:
+                collection.drop_index(other_name)
+                changes.append(f"dropped {collection.name}.{other_name} (replaced by {spec['name']})")
+                del existing[other_name]
+        
+        try:
+            collection.create_index(keys, name=spec['name'], **options)
+            existing[spec['name']] = {'key': keys, **options}
+            changes.append(f"created {collection.name}.{spec['name']}")
+        except Exception as e:
+            changes.append(f"failed {collection.name}.{spec['name']}: {e}")
+            print(f"❌ Could not create index {collection.name}.{spec['name']}: {e}")
+    
+    # only now that every spec is in place
+    for name in retired:
+        if name in existing and name not in kept:
+            collection.drop_index(name)
+            changes.append(f"dropped {collection.name}.{name}")
+    
+    return changes
+
+def ensure_index_schema(force=False):
+    """Bring indexes (and one-time data fixes) up to INDEX_SCHEMA_VERSION.
+    
+    The applied version is kept in the schema_info collection, so a worker that finds
+    the database already current only pays for one find_one."""
+    if db is None:
+        return None
+    
+    schema_info = db['schema_info']
+    current = schema_info.find_one({'_id': 'indexes'}) or {}
+    applied_version = current.get('version', 0)
+    if applied_version >= INDEX_SCHEMA_VERSION and not force:
+        return current.get('report')
+    
+    changes = []
+    for version in sorted(SCHEMA_MIGRATIONS):
+        if applied_version < version <= INDEX_SCHEMA_VERSION:
+            for migration in SCHEMA_MIGRATIONS[version]:
+                changes.append(migration())
+    if changes:
+        invalidate_response_cache()  # migrations rewrite documents behind the cached listings
+    
+    for collection_name, specs in INDEX_SPECS.items():
+        changes.extend(apply_index_specs(db[collection_name], specs, RETIRED_INDEXES.get(collection_name, [])))
+    
+    report = {
+        'version': INDEX_SCHEMA_VERSION,
+        'changes': changes,
+        'unindexed_queries': check_hot_query_plans()
+    }
+    schema_info.update_one(
+        {'_id': 'indexes'},
+        {'$set': {'version': INDEX_SCHEMA_VERSION, 'applied_at': datetime.now(), 'report': report}},
+        upsert=True
+    )
+    print(f"✓ Index schema at version {INDEX_SCHEMA_VERSION} ({len(changes)} change(s))")
+    return report
+
+def ensure_index_schema_in_background():
+    """Run the index migration without holding up startup (waits for Mongo if it's down)"""
+    def run():
+        delay = 15
+        while True:
+            try:
+                ensure_index_schema()
+                return
+            except ConnectionFailure as e:
+                print(f"⚠️ MongoDB unavailable, retrying index schema in {delay}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 600)
+            except Exception as e:
+                print(f"❌ Error applying index schema: {e}")
+                return
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return thread
+
 @app.route('/api/admin/initialize-database', methods=['POST'])
 @require_auth
 @require_admin
@@ -2133,35 +4139,99 @@ def initialize_database():
         if db is None:
             return jsonify({'status': 'error', 'message': 'Database not available'}), 500
         
-        # Create collections if they don't exist (MongoDB creates them automatically on first insert)
-        # But we can create indexes for better performance
-        
-        # Create indexes for inspections collection
-        inspections_collection.create_index([("van_number", 1)])
-        inspections_collection.create_index([("event_name", 1)])
-        inspections_collection.create_index([("created_at", -1)])
-        inspections_collection.create_index([("inspector_id", 1)])
-        
-        # Create indexes for users collection
-        users_collection.create_index([("capid", 1)], unique=True)
-        users_collection.create_index([("email", 1)], unique=True)
-        
-        # Create indexes for events collection
-        events_collection.create_index([("name", 1)], unique=True)
-        events_collection.create_index([("is_locked", 1)])
-        
-        # Create indexes for activity collection
-        activity_collection.create_index([("timestamp", -1)])
-        activity_collection.create_index([("type", 1)])
+        # Collections get created on first insert - this just forces the index schema
+        report = ensure_index_schema(force=True)
         
         return jsonify({
             'status': 'success', 
-            'message': f'Database "{MONGODB_DATABASE}" initialized successfully with indexes'
+            'message': f'Database "{MONGODB_DATABASE}" initialized successfully with indexes',
+            'report': report
         })
         
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/admin/reconcile-videos', methods=['POST'])
+@require_auth
+@require_admin
+def reconcile_videos():
+    """Check video locations against disk and Google Drive - super admin only"""
+    if not session.get('is_super_admin', False):
+        return jsonify({'status': 'error', 'message': 'Super admin access required'}), 403
+    
+    if inspections_collection is None:
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 500
+    
+    try:
+        repair = request.args.get('repair', 'true').lower() == 'true'
+        report = reconcile_video_locations(repair=repair)
+        return jsonify({'status': 'success', 'report': report})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# Recent activity feed: inspections and activity log entries merged in one query, ordered
+# by real datetimes. Every admin dashboard asks for this, so results are cached briefly
+# (the 'recent_activity' response cache scope).
+RECENT_ACTIVITY_LIMIT = 10
+RECENT_ACTIVITY_ICONS = {
+    'inspection_deleted': '🗑️',
+    'event_locked': '🔒',
+    'event_unlocked': '🔓',
+    'events_merged': '🔄',
+    'event_deleted': '🗑️'
+}
+def load_recent_activity():
+    """The newest RECENT_ACTIVITY_LIMIT inspections/activity entries, newest first"""
+    pipeline = [
+        {'$sort': {'created_at': -1, '_id': -1}},
+        {'$limit': RECENT_ACTIVITY_LIMIT},
+        {'$project': {
+            'type': {'$literal': 'inspection'}, 'at': '$created_at',
+            'van_number': 1, 'event_name': 1, 'inspector_id': 1, 'inspector_name': 1
+        }}
+    ]
+    if activity_collection is not None:
+        pipeline.append({'$unionWith': {
+            'coll': activity_collection.name,
+            'pipeline': [
+                {'$match': {'type': {'$in': list(RECENT_ACTIVITY_ICONS)}}},
+                {'$sort': {'logged_at': -1, '_id': -1}},
+                {'$limit': RECENT_ACTIVITY_LIMIT},
+                {'$set': {'at': '$logged_at'}}
+            ]
+        }})
+    pipeline += [{'$sort': {'at': -1}}, {'$limit': RECENT_ACTIVITY_LIMIT}]
+    entries = list(inspections_collection.aggregate(pipeline))
+    
+    # one pass over Member.txt for every inspector that needs a name
+    members = find_members_info(e.get('inspector_id') for e in entries if e['type'] == 'inspection' and not e.get('inspector_name'))
+    return [recent_activity_item(entry, members) for entry in entries]
+
+def recent_activity_item(entry, members):
+    """Dashboard line for an inspection (type 'inspection', 'at' = created_at) or an activity entry"""
+    if entry['type'] == 'inspection':
+        inspector_name = entry.get('inspector_name', '')
+        inspector_id = entry.get('inspector_id', '')
+        if not inspector_name and inspector_id:
+            member_info = members.get(str(inspector_id))
+            if member_info:
+                inspector_name = f"{member_info.get('rank', '')} {member_info.get('first_name', '')} {member_info.get('last_name', '')} ({inspector_id})".strip()
+            else:
+                inspector_name = f"CAPID {inspector_id}"
+        elif not inspector_name:
+            inspector_name = "Unknown Inspector"
+        text = f"COV {entry.get('van_number', 'Unknown COV')} inspected at {entry.get('event_name', 'Unknown Event')} by {inspector_name}"
+    else:
+        text = f"{RECENT_ACTIVITY_ICONS[entry['type']]} {describe_activity(entry)}"
+    
+    at = entry.get('at')
+    return {
+        'time': at.strftime('%m/%d %H:%M') if isinstance(at, datetime) else 'Unknown',
+        'timestamp': format_timestamp(at),
+        'text': text,
+        'type': entry['type']
+    }
+
 @app.route('/api/admin/recent-activity')
 @require_auth
 @require_admin
@@ -2171,129 +4241,296 @@ def admin_recent_activity():
         return jsonify({'status': 'error', 'message': 'Database not available'}), 500
     
     try:
-        activities = []
-        
-        # Get recent inspections (last 5)
-        recent_inspections = list(inspections_collection.find().sort('created_at', -1).limit(5))
-        for inspection in recent_inspections:
-            # Format time
-            created_at = inspection.get('created_at', '')
-            if created_at:
-                try:
-                    from datetime import datetime
-                    if isinstance(created_at, str):
-                        dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    else:
-                        dt = created_at
-                    time_str = dt.strftime('%m/%d %H:%M')
-                except Exception as e:
-                    time_str = 'Unknown'
-            else:
-                time_str = 'Unknown'
-            
-            # Get inspector info
-            inspector_name = inspection.get('inspector_name', '')
-            inspector_id = inspection.get('inspector_id', '')
+        # a burst of dashboard refreshes runs the query once
+        activities = cached_response_value('recent_activity', None, load_recent_activity)
+        return jsonify({'status': 'success', 'activities': activities})
+        
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# Live admin dashboard: one watcher per process turns database changes into small deltas
+# and fans them out to every open /api/admin/live stream, so open dashboards stay current
+# without each of them re-running the stats/events/activity queries.
+# Replica sets use a change stream; standalone Mongo gets polled off the updated_at /
+# logged_at indexes instead.
+LIVE_POLL_SECONDS = float(os.getenv('LIVE_POLL_SECONDS', '5'))
+LIVE_STREAM_SECONDS = int(os.getenv('LIVE_STREAM_SECONDS', '600'))  # streams end and reconnect, freeing the server thread
+LIVE_MAX_CLIENTS = int(os.getenv('LIVE_MAX_CLIENTS', '3'))  # each open stream holds a server thread (see WAITRESS_THREADS)
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_IDLE_SECONDS = 60  # watcher stops this long after the last dashboard closes
+LIVE_QUEUE_SIZE = 200
+LIVE_POLL_LIMIT = 200  # more changes than this in one poll and dashboards just reload
+LIVE_INSPECTION_FIELDS = {
+    'van_number': 1, 'event_name': 1, 'inspector_id': 1, 'inspector_name': 1,
+    'video_status': 1, 'created_at': 1, 'updated_at': 1
+}
+LIVE_KNOWN_INSPECTIONS = 20000  # inspections whose event/status the watcher remembers
+live_subscribers = []
+live_lock = threading.Lock()
+live_watcher = {'thread': None, 'mode': None, 'idle_since': None}
+# inspection id -> (event_name, video_status) as the watcher last saw it, so update and
+# delete deltas can say what they replaced (only the watcher thread touches this)
+live_known_inspections = OrderedDict()
+
+def publish_live(kind, data):
+    """Hand a delta to every open stream. A stream that stopped reading gets dropped and
+    told to reload rather than holding up everyone else."""
+    with live_lock:
+        for subscriber in list(live_subscribers):
+            try:
+                subscriber['queue'].put_nowait((kind, data))
+            except queue.Full:
+                subscriber['dropped'] = True
+                live_subscribers.remove(subscriber)
+
+def subscribe_live():
+    with live_lock:
+        if len(live_subscribers) >= LIVE_MAX_CLIENTS:
+            return None
+        subscriber = {'queue': queue.Queue(maxsize=LIVE_QUEUE_SIZE), 'dropped': False}
+        live_subscribers.append(subscriber)
+        live_watcher['idle_since'] = None
+        if live_watcher['thread'] is None:
+            thread = threading.Thread(target=run_live_watcher)
+            thread.daemon = True
+            live_watcher['thread'] = thread
+            thread.start()
+        return subscriber
+
+def unsubscribe_live(subscriber):
+    with live_lock:
+        if subscriber in live_subscribers:
+            live_subscribers.remove(subscriber)
+        if not live_subscribers and live_watcher['idle_since'] is None:
+            live_watcher['idle_since'] = time.time()
+
+def live_wanted():
+    """False once nobody has been listening for LIVE_IDLE_SECONDS (the watcher then exits)"""
+    with live_lock:
+        if live_subscribers or live_watcher['idle_since'] is None:
+            return True
+        if time.time() - live_watcher['idle_since'] < LIVE_IDLE_SECONDS:
+            return True
+        live_watcher['thread'] = None
+        live_watcher['mode'] = None
+        return False
+
+def live_inspection_delta(op, inspection_id, doc):
+    delta = {'op': op, 'id': str(inspection_id)}
+    if doc:
+        for field in LIVE_INSPECTION_FIELDS:
+            value = doc.get(field)
+            delta[field] = format_timestamp(value) if isinstance(value, datetime) else value
+    return delta
+
+def live_event_delta(op, event_id, doc):
+    delta = {'op': op, 'id': str(event_id)}
+    if doc:
+        delta.update({
+            'name': doc.get('name', ''),
+            'locked': doc.get('is_locked', False),
+            'locked_by': doc.get('locked_by', ''),
+            'locked_at': format_timestamp(doc.get('locked_at')) or ''
+        })
+    return delta
+
+def live_activity_delta(entry):
+    """Recent activity line plus the event names it touches (so event counts can follow)"""
+    if entry.get('type') == 'inspection':
+        members = find_members_info([entry.get('inspector_id')] if not entry.get('inspector_name') else [])
+    else:
+        members = {}
+    item = recent_activity_item(entry, members)
+    item['events'] = entry.get('events') or activity_events(entry)
+    return item
+
+def publish_inspection_change(op, inspection_id, doc, changed_fields=None):
+    """changed_fields: fields an update touched, when the source knows (change streams do)"""
+    delta = live_inspection_delta(op, inspection_id, doc)
+    key = str(inspection_id)
+    previous = live_known_inspections.pop(key, None)
+    if previous is None and op == 'update' and doc and changed_fields is not None \
+            and 'event_name' not in changed_fields and 'video_status' not in changed_fields:
+        previous = (doc.get('event_name'), doc.get('video_status'))
+    if previous is not None:
+        # dashboards move this inspection's counts from the old values to the new ones;
+        # without them they reload the event counts instead
+        delta['previous_event_name'], delta['previous_video_status'] = previous
+    if op != 'delete' and doc:
+        live_known_inspections[key] = (doc.get('event_name'), doc.get('video_status'))
+        while len(live_known_inspections) > LIVE_KNOWN_INSPECTIONS:
+            live_known_inspections.popitem(last=False)
+    publish_live('inspection', delta)
+    if op == 'insert' and doc:
+        publish_live('activity', live_activity_delta({**doc, 'type': 'inspection', 'at': doc.get('created_at')}))
+
+def publish_activity_entry(entry):
+    if entry.get('type') in RECENT_ACTIVITY_ICONS:
+        publish_live('activity', live_activity_delta({**entry, 'at': entry.get('logged_at')}))
+
+def watch_live_changes():
+    """Follow inspections, events, activity and the dashboard counters through one
+    change stream, resuming after errors. Returns when nobody is listening."""
+    collections = [inspections_collection.name, events_collection.name, 'app_stats']
+    if activity_collection is not None:
+        collections.append(activity_collection.name)
+    pipeline = [{'$match': {
+        'ns.coll': {'$in': collections},
+        'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}
+    }}]
+    resume_token = None
+    while live_wanted():
+        try:
+            with db.watch(pipeline, full_document='updateLookup', resume_after=resume_token, max_await_time_ms=1000) as stream:
+                while live_wanted():
+                    change = stream.try_next()
+                    resume_token = stream.resume_token
+                    if change is None:
+                        continue
+                    coll = change['ns']['coll']
+                    op = change['operationType']
+                    doc_id = change['documentKey']['_id']
+                    doc = change.get('fullDocument')
+                    if coll == inspections_collection.name:
+                        changed_fields = None
+                        if op == 'update' and change.get('updateDescription'):
+                            description = change['updateDescription']
+                            changed_fields = {path.split('.')[0] for path in description.get('updatedFields', {})}
+                            changed_fields.update(path.split('.')[0] for path in description.get('removedFields', []))
+                        publish_inspection_change(op, doc_id, doc, changed_fields)
+                    elif coll == events_collection.name:
+                        publish_live('event', live_event_delta('delete' if op == 'delete' else 'upsert', doc_id, doc))
+                    elif coll == 'app_stats':
+                        if doc_id == 'admin_stats' and doc:
+                            publish_live('stats', admin_stats_payload(doc))
+                    elif op == 'insert' and doc:
+                        publish_activity_entry(doc)
+        except Exception as e:
+            print(f"⚠️  Live change stream interrupted, resuming: {e}")
+            time.sleep(5)
+
+def poll_live_changes():
+    """Standalone Mongo has no change streams: every LIVE_POLL_SECONDS read what changed
+    in a window that trails the clock like the delta export, so late commits aren't missed"""
+    since = datetime.now() - timedelta(seconds=DELTA_SAFETY_SECONDS)
+    events_version = None
+    events_seen = {}
+    last_stats = None
+    while live_wanted():
+        time.sleep(LIVE_POLL_SECONDS)
+        try:
+            until = datetime.now() - timedelta(seconds=DELTA_SAFETY_SECONDS)
+            window = {'$gte': since, '$lt': until}
             
-            if not inspector_name and inspector_id:
-                try:
-                    member_info = find_member_info(inspector_id)
-                    if member_info:
-                        inspector_name = f"{member_info.get('rank', '')} {member_info.get('first_name', '')} {member_info.get('last_name', '')} ({inspector_id})".strip()
-                    else:
-                        inspector_name = f"CAPID {inspector_id}"
-                except:
-                    inspector_name = f"CAPID {inspector_id}" if inspector_id else "Unknown Inspector"
-            elif not inspector_name:
-                inspector_name = "Unknown Inspector"
+            # inserts come from their own created_at window: the video worker moves updated_at
+            # right after an upload, so updated_at alone can't tell a new inspection apart
+            inserted = list(inspections_collection.find({'created_at': window}, LIVE_INSPECTION_FIELDS)
+                            .sort([('created_at', 1), ('_id', 1)]).limit(LIVE_POLL_LIMIT + 1))
+            updated = list(inspections_collection.find({'updated_at': window}, LIVE_INSPECTION_FIELDS)
+                           .sort([('updated_at', 1), ('_id', 1)]).limit(LIVE_POLL_LIMIT + 1))
+            entries = []
+            if activity_collection is not None:
+                entries = list(activity_collection.find({'logged_at': window})
+                               .sort([('logged_at', 1), ('_id', 1)]).limit(LIVE_POLL_LIMIT + 1))
+            since = until
             
-            # Create activity text
-            van_number = inspection.get('van_number', 'Unknown COV')
-            event_name = inspection.get('event_name', 'Unknown Event')
+            if max(len(inserted), len(updated), len(entries)) > LIVE_POLL_LIMIT:
+                publish_live('reload', {})
+            else:
+                inserted_ids = {doc['_id'] for doc in inserted}
+                for doc in inserted:
+                    publish_inspection_change('insert', doc['_id'], doc)
+                for doc in updated:
+                    if doc['_id'] not in inserted_ids:
+                        publish_inspection_change('update', doc['_id'], doc)
+                for entry in entries:
+                    if entry.get('type') == 'inspection_deleted' and entry.get('inspection_id'):
+                        publish_live('inspection', live_inspection_delta('delete', entry['inspection_id'], None))
+                    publish_activity_entry(entry)
             
-            activity_text = f"COV {van_number} inspected at {event_name} by {inspector_name}"
+            # events only get read when something bumped their version (a few of them at most)
+            version = get_data_version('events')
+            if version != events_version:
+                current = {str(e['_id']): e for e in events_collection.find({}, {'name': 1, 'is_locked': 1, 'locked_by': 1, 'locked_at': 1})}
+                if events_version is not None:
+                    for event_id, event in current.items():
+                        delta = live_event_delta('upsert', event_id, event)
+                        if events_seen.get(event_id) != delta:
+                            publish_live('event', delta)
+                    for event_id in set(events_seen) - set(current):
+                        publish_live('event', live_event_delta('delete', event_id, None))
+                events_seen = {event_id: live_event_delta('upsert', event_id, event) for event_id, event in current.items()}
+                events_version = version
             
-            activities.append({
-                'time': time_str,
-                'text': activity_text,
-                'type': 'inspection'
-            })
-        
-        # Get recent activity log entries (deletions, event changes)
-        if activity_collection is not None:
-            recent_activities = list(activity_collection.find().sort('timestamp', -1).limit(5))
-            for activity in recent_activities:
-                try:
-                    from datetime import datetime
-                    if isinstance(activity.get('timestamp'), str):
-                        dt = datetime.fromisoformat(activity['timestamp'].replace('Z', '+00:00'))
-                    else:
-                        dt = activity.get('deleted_at') or activity.get('timestamp')
-                    time_str = dt.strftime('%m/%d %H:%M')
-                except:
-                    time_str = 'Unknown'
-                
-                activity_type = activity.get('type', '')
-                if activity_type == 'inspection_deleted':
-                    van_number = activity.get('van_number', 'Unknown COV')
-                    event_name = activity.get('event_name', 'Unknown Event')
-                    deleted_by_name = activity.get('deleted_by_name', 'Unknown')
-                    if not deleted_by_name or deleted_by_name == 'Unknown':
-                        # Fallback to CAPID if name not stored
-                        deleted_by_capid = activity.get('deleted_by', 'Unknown')
-                        deleted_by_name = f"CAPID {deleted_by_capid}" if deleted_by_capid != 'Unknown' else 'Unknown'
-                    activity_text = f"🗑️ COV {van_number} inspection deleted from {event_name} by {deleted_by_name}"
-                elif activity_type == 'event_locked':
-                    event_name = activity.get('event_name', 'Unknown Event')
-                    locked_by_name = activity.get('locked_by_name', 'Unknown')
-                    if not locked_by_name or locked_by_name == 'Unknown':
-                        # Fallback to CAPID if name not stored
-                        locked_by_capid = activity.get('locked_by', 'Unknown')
-                        locked_by_name = f"CAPID {locked_by_capid}" if locked_by_capid != 'Unknown' else 'Unknown'
-                    activity_text = f"🔒 Event '{event_name}' locked by {locked_by_name}"
-                elif activity_type == 'event_unlocked':
-                    event_name = activity.get('event_name', 'Unknown Event')
-                    unlocked_by_name = activity.get('unlocked_by_name', 'Unknown')
-                    if not unlocked_by_name or unlocked_by_name == 'Unknown':
-                        # Fallback to CAPID if name not stored
-                        unlocked_by_capid = activity.get('unlocked_by', 'Unknown')
-                        unlocked_by_name = f"CAPID {unlocked_by_capid}" if unlocked_by_capid != 'Unknown' else 'Unknown'
-                    activity_text = f"🔓 Event '{event_name}' unlocked by {unlocked_by_name}"
-                elif activity_type == 'events_merged':
-                    source_event = activity.get('source_event', 'Unknown')
-                    target_event = activity.get('target_event', 'Unknown')
-                    inspections_moved = activity.get('inspections_moved', 0)
-                    merged_by_name = activity.get('merged_by_name', 'Unknown')
-                    if not merged_by_name or merged_by_name == 'Unknown':
-                        merged_by_capid = activity.get('merged_by', 'Unknown')
-                        merged_by_name = f"CAPID {merged_by_capid}" if merged_by_capid != 'Unknown' else 'Unknown'
-                    activity_text = f"🔄 Event '{source_event}' merged into '{target_event}' ({inspections_moved} inspections) by {merged_by_name}"
-                elif activity_type == 'event_deleted':
-                    event_name = activity.get('event_name', 'Unknown Event')
-                    deleted_by_name = activity.get('deleted_by_name', 'Unknown')
-                    if not deleted_by_name or deleted_by_name == 'Unknown':
-                        deleted_by_capid = activity.get('deleted_by', 'Unknown')
-                        deleted_by_name = f"CAPID {deleted_by_capid}" if deleted_by_capid != 'Unknown' else 'Unknown'
-                    activity_text = f"🗑️ Event '{event_name}' deleted by {deleted_by_name}"
-                else:
-                    continue
-                
-                activities.append({
-                    'time': time_str,
-                    'text': activity_text,
-                    'type': activity_type
-                })
+            stats = db['app_stats'].find_one({'_id': 'admin_stats'})
+            if stats is not None:
+                payload = admin_stats_payload(stats)
+                if last_stats is not None and payload != last_stats:
+                    publish_live('stats', payload)
+                last_stats = payload
+        except Exception as e:
+            print(f"⚠️  Live dashboard poll failed: {e}")
+
+def run_live_watcher():
+    try:
+        client.admin.command('ping')  # settles the topology so we know what we're talking to
+        # change streams need the same deployment as transactions
+        live_watcher['mode'] = 'change_stream' if supports_transactions() else 'polling'
+    except Exception as e:
+        print(f"⚠️  Live dashboard falling back to polling: {e}")
+        live_watcher['mode'] = 'polling'
+    live_known_inspections.clear()  # anything remembered from an earlier watcher may be stale
+    print(f"📡 Live dashboard feed started ({live_watcher['mode']})")
+    try:
+        if live_watcher['mode'] == 'change_stream':
+            watch_live_changes()
         else:
-            pass  # No activity collection available
-        
-        # Sort all activities by time (most recent first) and limit to 10
-        activities.sort(key=lambda x: x['time'], reverse=True)
-        activities = activities[:10]
-        
-        return jsonify({'status': 'success', 'activities': activities})
-        
+            poll_live_changes()
+        print("📡 Live dashboard feed stopped (no dashboards open)")
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        print(f"❌ Live dashboard feed crashed: {e}")
+    finally:
+        # let the next dashboard start a fresh watcher
+        with live_lock:
+            if live_watcher['thread'] is threading.current_thread():
+                live_watcher['thread'] = None
+
+@app.route('/api/admin/live')
+@require_auth
+@require_admin
+def admin_live():
+    """Server-sent events for the admin dashboard: stats, event, inspection and activity deltas"""
+    if db is None or inspections_collection is None or events_collection is None:
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 500
+    
+    subscriber = subscribe_live()
+    if subscriber is None:
+        # the dashboard falls back to refreshing on a timer
+        return jsonify({'status': 'error', 'message': 'Too many live dashboards open'}), 503
+    
+    def stream():
+        deadline = time.time() + LIVE_STREAM_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            yield f"event: hello\ndata: {json.dumps({'mode': live_watcher['mode']})}\n\n"
+            while time.time() < deadline:
+                try:
+                    kind, data = subscriber['queue'].get(timeout=LIVE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+                if subscriber['dropped'] and subscriber['queue'].empty():
+                    # fell too far behind - deltas were lost, so start over from a full load
+                    yield "event: reload\ndata: {}\n\n"
+                    break
+        finally:
+            unsubscribe_live(subscriber)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/admin/cov/<cov_number>')
 @require_auth
@@ -2329,15 +4566,27 @@ def delete_inspection(inspection_id):
         # Check if the event is locked
         event_name = inspection.get('event_name')
         if event_name and event_name != 'No Event':
-            # Check if event is locked
-            event = events_collection.find_one({'name': event_name}) if events_collection is not None else None
-            if event and event.get('is_locked', False):
+            # Check if event is locked - straight from the database, a delete can't risk a stale answer
+            if events_collection is None:
+                return jsonify({'status': 'error', 'message': 'Database not available'}), 500
+            if events_collection.find_one({'name': event_name, 'is_locked': True}, {'_id': 1}):
                 return jsonify({'status': 'error', 'message': f'Cannot delete inspection from locked event: "{event_name}"'}), 403
             
         # Event is not locked or has no event, proceed with deletion
         result = inspections_collection.delete_one({'_id': ObjectId(inspection_id)})
         
         if result.deleted_count > 0:
+            bump_data_version('events')
+            refresh_cov_summary(inspection.get('van_number'))
+            adjust_admin_stats(
+                total_inspections=-1,
+                total_events=-1 if is_last_event_inspection(inspection.get('event_name')) else 0,
+                videos_with_issues=-is_video_issue(inspection)
+            )
+            invalidate_response_cache(*INSPECTION_CACHE_SCOPES)
+            if inspection.get('video_filename'):
+                invalidate_video_location(inspection['video_filename'])
+            
             # Log the deletion activity
             try:
                 from datetime import datetime
@@ -2366,8 +4615,7 @@ def delete_inspection(inspection_id):
                     'deleted_at': datetime.now(),
                     'timestamp': datetime.now().isoformat()
                 }
-                if activity_collection is not None:
-                    activity_collection.insert_one(activity_log)
+                log_activity(activity_log)
             except Exception as e:
                 print(f"Error logging deletion activity: {e}")
             
@@ -2378,69 +4626,53 @@ def delete_inspection(inspection_id):
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# sort keys /api/covs accepts - each one has an index on cov_summary
+COV_SORT_FIELDS = ['cov_number', 'total_inspections', 'last_inspection', 'first_inspection', 'event_count', 'inspector_count']
+
 @app.route('/api/covs', methods=['GET'])
 def get_covs():
     """Get list of all COVs with inspection counts and events"""
-    if inspections_collection is None:
+    if cov_summary_collection is None:
         return jsonify({'status': 'error', 'message': 'Database not available'}), 500
     
     try:
         # Get sorting parameters
         sort_by = request.args.get('sort', 'cov_number')
         sort_order = request.args.get('order', 'asc')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 12))
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 12)), 1), 100)
         
-        # Build sort criteria
-        sort_direction = 1 if sort_order == 'asc' else -1
-        sort_criteria = {sort_by: sort_direction}
+        if sort_by not in COV_SORT_FIELDS:
+            return jsonify({'status': 'error', 'message': f'Invalid sort field: {sort_by}'}), 400
         
-        # Aggregate to get COV statistics
-        pipeline = [
-            {
-                '$group': {
-                    '_id': '$van_number',
-                    'total_inspections': {'$sum': 1},
-                    'events': {'$addToSet': '$event_name'},
-                    'last_inspection': {'$max': '$created_at'},
-                    'first_inspection': {'$min': '$created_at'},
-                    'inspectors': {'$addToSet': '$inspector_id'}
-                }
-            },
-            {
-                '$project': {
-                    'cov_number': '$_id',
-                    'total_inspections': 1,
-                    'event_count': {'$size': '$events'},
-                    'events': 1,
-                    'last_inspection': 1,
-                    'first_inspection': 1,
-                    'inspector_count': {'$size': '$inspectors'},
-                    'inspectors': 1
+        # Build sort criteria (cov_number breaks ties so pages don't overlap). The tie-breaker
+        # runs the same direction so a descending sort walks the (field, cov_number) index backwards
+        sort_direction = 1 if sort_order == 'asc' else -1
+        sort_criteria = [(sort_by, sort_direction)]
+        if sort_by != 'cov_number':
+            sort_criteria.append(('cov_number', sort_direction))
+        
+        def load_page():
+            # Pre-aggregated rows kept up to date by upload/delete/merge - just an indexed read
+            total = cov_summary_collection.estimated_document_count()
+            paginated_covs = list(
+                cov_summary_collection.find({})
+                .sort(sort_criteria)
+                .skip((page - 1) * per_page)
+                .limit(per_page)
+            )
+            return {
+                'status': 'success',
+                'covs': paginated_covs,
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': total,
+                    'pages': (total + per_page - 1) // per_page
                 }
-            },
-            {'$sort': sort_criteria}
-        ]
-        
-        # Execute aggregation
-        covs = list(inspections_collection.aggregate(pipeline))
-        
-        # Pagination
-        total = len(covs)
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_covs = covs[start:end]
-        
-        return jsonify({
-            'status': 'success',
-            'covs': paginated_covs,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page
             }
-        })
+        
+        return jsonify(cached_response_value('covs', (sort_by, sort_direction, page, per_page), load_page))
         
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -2469,6 +4701,7 @@ def get_cov_inspections(cov_number):
         # Convert ObjectId to string for JSON serialization and add legacy support
         for inspection in inspections:
             inspection['_id'] = str(inspection['_id'])
+            inspection['thumbnail_url'] = thumbnail_url(inspection.get('video_filename'))
             if 'created_at' in inspection:
                 inspection['created_at'] = inspection['created_at'].isoformat()
             if 'updated_at' in inspection:
@@ -2532,6 +4765,7 @@ def get_inspection_details(inspection_id):
         
         # Convert ObjectId to string for JSON serialization
         inspection['_id'] = str(inspection['_id'])
+        inspection['thumbnail_url'] = thumbnail_url(inspection.get('video_filename'))
         if 'created_at' in inspection:
             inspection['created_at'] = inspection['created_at'].isoformat()
         if 'updated_at' in inspection:
@@ -2562,65 +4796,197 @@ def get_inspection_details(inspection_id):
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def media_accel_location(directory):
+    """Internal proxy location for one of our media folders (see README for the nginx config)"""
+    locations = {
+        os.path.abspath(UPLOAD_FOLDER): 'uploads',
+        os.path.abspath(THUMB_FOLDER): 'thumbnails',
+        os.path.abspath(GDRIVE_CACHE_FOLDER): 'gdrive_cache',
+        os.path.abspath('static/images'): 'images'
+    }
+    return locations.get(os.path.abspath(directory))
+
+def send_media(directory, filename, max_age=None, immutable=False):
+    """Send a video or image with conditional GET (ETag/Last-Modified -> 304) and byte ranges.
+    
+    In x-accel mode the front-end proxy does the actual transfer; in x-sendfile mode
+    Flask's send_file hands it off for us (app.use_x_sendfile)."""
+    location = media_accel_location(directory) if MEDIA_ACCEL_MODE == 'x-accel' else None
+    
+    if location:
+        path = safe_join(directory, filename)
+        if path is None or not os.path.isfile(path):
+            raise NotFound()
+        from urllib.parse import quote
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        # nginx decodes the uri, so spaces, '?', '#' and non-ascii names have to be escaped
+        response.headers['X-Accel-Redirect'] = f"{MEDIA_ACCEL_PREFIX}/{quote(location)}/{quote(filename)}"
+    else:
+        response = send_from_directory(directory, filename, conditional=True, etag=True)
+        response.headers['Accept-Ranges'] = 'bytes'
+    
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = THUMB_IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    elif max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+def thumbnail_version(thumbnail_name):
+    """Short version tag for a thumbnail, changes whenever the file is regenerated"""
+    try:
+        stat = os.stat(os.path.join(THUMB_FOLDER, thumbnail_name))
+    except (OSError, TypeError):
+        return None
+    return f"{int(stat.st_mtime):x}{stat.st_size:x}"
+
+def thumbnail_url(video_filename):
+    """Content-versioned thumbnail url so browsers can cache it forever"""
+    if not video_filename:
+        return None
+    thumbnail_name = os.path.splitext(video_filename)[0] + '.jpg'
+    version = thumbnail_version(thumbnail_name)
+    if version:
+        return f"/thumbnail/{thumbnail_name}?v={version}"
+    return f"/thumbnail/{thumbnail_name}"
+
+# filename -> where we resolved it to last time, so the many Range requests a player
+# makes for one view don't each hit Mongo and the filesystem. Writes that change a
+# record's video call invalidate_video_location().
+video_location_cache = {}
+video_location_cache_lock = threading.Lock()
+VIDEO_LOCATION_CACHE_MAX = 5000
+
+def invalidate_video_location(filename=None):
+    """Forget cached locations for a video (original and converted names), or all of them"""
+    with video_location_cache_lock:
+        if filename is None:
+            video_location_cache.clear()
+            return
+        base_name = os.path.splitext(filename)[0]
+        for key in [k for k in video_location_cache if os.path.splitext(k)[0] == base_name]:
+            del video_location_cache[key]
+
+# just the fields video_location_for() needs
+VIDEO_LOCATION_FIELDS = {'video_location': 1, 'gdrive_file_id': 1, 'gdrive_converted_file_id': 1}
+
+def resolve_video_location(filename):
+    """Work out where a requested video lives: ('local', name) or ('gdrive', name, file_id)"""
+    # Get inspection record to find video location
+    inspection = inspections_collection.find_one({'video_filename': filename}, VIDEO_LOCATION_FIELDS)
+    return video_location_for(filename, inspection)
+
+def video_location_for(filename, inspection):
+    """Where a video lives given its inspection record (None if there isn't one).
+    Shared with serve_asgi.py, which looks the record up with the async driver."""
+    base_name = os.path.splitext(filename)[0]
+    mp4_filename = base_name + '.mp4'
+    
+    if not inspection:
+        # Fallback to old behavior for backward compatibility
+        if os.path.exists(os.path.join(UPLOAD_FOLDER, mp4_filename)):
+            return ('local', mp4_filename)
+        if os.path.exists(os.path.join(UPLOAD_FOLDER, filename)):
+            return ('local', filename)
+        return None
+        
+    video_location = inspection.get('video_location', 'local')  # Default to local for backward compatibility
+    
+    if video_location in ['local', 'both']:
+        # Try local first (faster)
+        if os.path.exists(os.path.join(UPLOAD_FOLDER, mp4_filename)):
+            return ('local', mp4_filename)
+        elif os.path.exists(os.path.join(UPLOAD_FOLDER, filename)):
+            return ('local', filename)
+    
+    if video_location in ['gdrive', 'both']:
+        # Serve from Google Drive (converted mp4 if we have one, otherwise the original)
+        if inspection.get('gdrive_converted_file_id'):
+            return ('gdrive', mp4_filename, inspection['gdrive_converted_file_id'])
+        return ('gdrive', filename, inspection.get('gdrive_file_id'))
+    
+    # video location is 'none' or file not found
+    return None
+
 @app.route('/video/<filename>')
 def serve_video(filename):
     """Serve video files based on actual storage location"""
     try:
-        # Get inspection record to find video location
-        inspection = inspections_collection.find_one({'video_filename': filename})
-        if not inspection:
-            # Fallback to old behavior for backward compatibility
-            return serve_video_fallback(filename)
-            
-        video_location = inspection.get('video_location', 'local')  # Default to local for backward compatibility
-        
-        if video_location in ['local', 'both']:
-            # Try local first (faster)
-            base_name = os.path.splitext(filename)[0]
-            mp4_filename = base_name + '.mp4'
-            mp4_path = os.path.join(UPLOAD_FOLDER, mp4_filename)
-            
-            if os.path.exists(mp4_path):
-                return send_from_directory(UPLOAD_FOLDER, mp4_filename)
-            elif os.path.exists(os.path.join(UPLOAD_FOLDER, filename)):
-                return send_from_directory(UPLOAD_FOLDER, filename)
-        
-        if video_location in ['gdrive', 'both']:
-            # Serve from Google Drive
-            return serve_from_google_drive(filename)
-            
-        # If we get here, video location is 'none' or file not found
-        return f"Video not found: {filename}", 404
+        with video_location_cache_lock:
+            location = video_location_cache.get(filename)
+        cached = location is not None
+        
+        if not cached:
+            location = resolve_video_location(filename)
+            if location is None:
+                return f"Video not found: {filename}", 404
+            with video_location_cache_lock:
+                if len(video_location_cache) >= VIDEO_LOCATION_CACHE_MAX:
+                    video_location_cache.pop(next(iter(video_location_cache)))
+                video_location_cache[filename] = location
         
-    except Exception as e:
-        return f"Video not found: {filename}", 404
-
-def serve_video_fallback(filename):
-    """Fallback method for serving videos (backward compatibility)"""
-    try:
-        # Check if there's a converted MP4 version available
-        base_name = os.path.splitext(filename)[0]
-        mp4_filename = base_name + '.mp4'
-        mp4_path = os.path.join(UPLOAD_FOLDER, mp4_filename)
+        try:
+            if location[0] == 'local':
+                return send_media(UPLOAD_FOLDER, location[1], max_age=VIDEO_CACHE_MAX_AGE)
+            return serve_from_google_drive(location[1], location[2])
+        except NotFound:
+            # file moved since we cached it - look it up fresh once
+            invalidate_video_location(filename)
+            if cached:
+                return serve_video(filename)
+            raise
         
-        # If MP4 version exists, serve it instead
-        if os.path.exists(mp4_path):
-            return send_from_directory(UPLOAD_FOLDER, mp4_filename)
-        else:
-            # Serve original file
-            return send_from_directory(UPLOAD_FOLDER, filename)
     except Exception as e:
         return f"Video not found: {filename}", 404
 
 @app.route('/thumbnail/<filename>')
 def serve_thumbnail(filename):
-    """Serve thumbnail files"""
+    """Serve thumbnail files, in the smallest format the browser accepts"""
+    if not filename.lower().endswith('.jpg') or not os.path.exists(os.path.join(THUMB_FOLDER, filename)):
+        # Make it in the background and send the placeholder until it's ready
+        # (short cache so the real one shows up on the next list render)
+        if filename.lower().endswith('.jpg'):
+            queue_thumbnail_generation(filename)
+        response = send_media(os.path.dirname(PLACEHOLDER_THUMB), os.path.basename(PLACEHOLDER_THUMB), max_age=30)
+        return response
+    
     try:
-        # Try to serve actual thumbnail
-        return send_from_directory(THUMB_FOLDER, filename)
+        # Versioned urls (?v=) point at exactly one file, so they can be cached forever
+        requested_version = request.args.get('v')
+        immutable = bool(requested_version) and requested_version == thumbnail_version(filename)
+        
+        # only formats the browser names explicitly - */* doesn't mean it can decode avif
+        accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+        base_name = os.path.splitext(filename)[0]
+        served_name = filename
+        missing_variant = False
+        for ext, mimetype, _ in THUMB_VARIANTS:
+            if ext in unsupported_thumb_variants:
+                continue
+            if not os.path.exists(os.path.join(THUMB_FOLDER, f"{base_name}.{ext}")):
+                missing_variant = True
+            elif mimetype in accepted and served_name == filename:
+                served_name = f"{base_name}.{ext}"
+        
+        if missing_variant:
+            # older thumbnails from before we made variants
+            queue_thumbnail_generation(filename)
+        
+        response = send_media(THUMB_FOLDER, served_name, immutable=immutable)
+        response.vary.add('Accept')
+        return response
     except Exception as e:
-        # Return placeholder image if thumbnail doesn't exist
-        return send_from_directory('static/images', 'video_placeholder.svg')
+        return send_media(os.path.dirname(PLACEHOLDER_THUMB), os.path.basename(PLACEHOLDER_THUMB), max_age=30)
+
+# startup work runs in the background once everything above is defined - importing
+# the module never waits on MongoDB
+check_mongo_connection_in_background()
+ensure_index_schema_in_background()
+start_stats_recount_timer()
 
 if __name__=='__main__':
     app.run(host=os.getenv('FLASK_HOST', '0.0.0.0'), 
@@ -0,0 +1,53 @@
+# export_parquet.py
+# Typed Parquet export of the inspections for pandas / Arrow analysis, e.g.:
+#   python export_parquet.py --out C:\cov_web\exports\inspections.parquet --event "Wing Conference" --start-date 2025-01-01
+# Needs pyarrow (pip install pyarrow)
+import argparse
+import os
+import sys
+from cov_web import write_inspections_parquet, export_filter_from_args, inspections_collection
+
+def main():
+    parser = argparse.ArgumentParser(description='Export inspections to a typed Parquet file')
+    parser.add_argument('--out', required=True, help='Parquet file to write')
+    parser.add_argument('--event', help='only this event')
+    parser.add_argument('--van-number', help='only this COV')
+    parser.add_argument('--inspector-id', help='only this inspector CAPID')
+    parser.add_argument('--start-date', help='created on or after YYYY-MM-DD')
+    parser.add_argument('--end-date', help='created on or before YYYY-MM-DD')
+    parser.add_argument('--columns', help='comma separated list of columns to keep')
+    args = parser.parse_args()
+
+    if inspections_collection is None:
+        print("❌ Database not available")
+        return 1
+
+    query, error = export_filter_from_args({
+        'event': args.event,
+        'van_number': args.van_number,
+        'inspector_id': args.inspector_id,
+        'start_date': args.start_date,
+        'end_date': args.end_date
+    })
+    if error:
+        print(f"❌ {error}")
+        return 1
+    columns = [c.strip() for c in (args.columns or '').split(',') if c.strip()]
+
+    out_dir = os.path.dirname(os.path.abspath(args.out))
+    os.makedirs(out_dir, exist_ok=True)
+    try:
+        rows = write_inspections_parquet(query, args.out, columns or None)
+    except ImportError:
+        print("❌ pyarrow library not available. Install with: pip install pyarrow")
+        return 1
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    size_kb = os.path.getsize(args.out) / 1024
+    print(f"✓ Wrote {rows} inspection(s) to {args.out} ({size_kb:.1f} KB)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
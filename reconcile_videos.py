@@ -0,0 +1,44 @@
+# reconcile_videos.py
+# Nightly check that video_location fields match what's really on disk / in Google Drive
+# Schedule with cron or Windows Task Scheduler, e.g.:  python reconcile_videos.py --report C:\cov_web\reports
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from cov_web import reconcile_video_locations, inspections_collection
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile video location metadata with local files and Google Drive')
+    parser.add_argument('--dry-run', action='store_true', help='report discrepancies without fixing them')
+    parser.add_argument('--report', help='folder to write the JSON discrepancy report to')
+    args = parser.parse_args()
+
+    if inspections_collection is None:
+        print("❌ Database not available")
+        return 1
+
+    report = reconcile_video_locations(repair=not args.dry_run)
+
+    print("=" * 60)
+    print(f"🎬 Checked {report['inspections_checked']} inspections with video")
+    print(f"📁 Local files found: {report['local_files_found']}")
+    print(f"☁️  Drive files checked: {report['drive_files_checked']} ({report['drive_missing']} missing, {report['drive_unverified']} unverified)")
+    print(f"⚠️  Discrepancies: {report['discrepancy_count']}")
+    print(f"🔧 Repaired: {report['repaired']}")
+    print("=" * 60)
+
+    for item in report['discrepancies']:
+        print(f"   • COV {item['van_number']} {item['filename']}: {item['field']} {item['stored']} → {item['actual']}")
+
+    if args.report:
+        os.makedirs(args.report, exist_ok=True)
+        report_path = os.path.join(args.report, f"video_reconciliation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {report_path}")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -64,6 +64,8 @@ def log_incoming_request():
 if __name__ == '__main__':
     host = os.getenv('FLASK_HOST', '0.0.0.0')
     port = int(os.getenv('FLASK_PORT', 8500))
+    # open live dashboard streams each keep a thread busy, so leave room for them
+    threads = int(os.getenv('WAITRESS_THREADS', '8'))
     
     # Get local IP address
     local_ip = get_local_ip()
@@ -74,6 +76,7 @@ if __name__ == '__main__':
     print(f"📱 Touch-Friendly Interface Ready")
     print(f"🗄️  MongoDB: {os.getenv('MONGODB_DATABASE', 'cov_inspections')}")
     print(f"🌐 Server: {host}:{port}")
+    print(f"⚙️  Threads: {threads}")
     print("=" * 60)
     print("📍 Access URLs:")
     print(f"   • Local:    http://127.0.0.1:{port}")
@@ -83,4 +86,4 @@ if __name__ == '__main__':
     print("🔧 Production server with Waitress")
     print("=" * 60)
     
-    serve(app, host=host, port=port)
\ No newline at end of file
+    serve(app, host=host, port=port, threads=threads)
\ No newline at end of file
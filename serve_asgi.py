@@ -0,0 +1,261 @@
+# serve_asgi.py
+# Optional ASGI server. Video downloads and Google Drive proxying run as async handlers on
+# one event loop (async Mongo lookup, async file reads, streamed Drive responses), so a pile
+# of slow video connections no longer holds a thread each. Every other route is the normal
+# Flask app behind a WSGI bridge with its own thread pool.
+#
+#   pip install uvicorn starlette a2wsgi motor httpx
+#   python serve_asgi.py
+import os
+import threading
+import mimetypes
+import contextlib
+from email.utils import formatdate
+
+import anyio
+import httpx
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse, PlainTextResponse
+from starlette.routing import Route, Mount
+from werkzeug.security import safe_join
+from google.oauth2 import service_account
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from dotenv import load_dotenv
+
+from cov_web import (
+    app, MONGODB_URI, MONGODB_DATABASE, MONGODB_MAX_POOL_SIZE, MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    UPLOAD_FOLDER, GDRIVE_CACHE_FOLDER, GOOGLE_CREDENTIALS_PATH, VIDEO_CACHE_MAX_AGE, MEDIA_ACCEL_MODE,
+    VIDEO_LOCATION_FIELDS, VIDEO_LOCATION_CACHE_MAX, video_location_for, video_location_cache,
+    video_location_cache_lock, invalidate_video_location, gdrive_cache_lock, gdrive_cache_inflight,
+    gdrive_cache_name, lookup_gdrive_cache, get_cached_gdrive_file, find_google_drive_file_id
+)
+
+# Load environment variables
+load_dotenv()
+
+# One process: the video location cache, event lock map, response cache and the Drive
+# cache index (with its disk budget) live in process memory, and the index migration and
+# stats recount start on import. More processes would each keep their own copies (and
+# could evict each other's cached Drive files), so raise this only with that in mind.
+ASGI_WORKERS = int(os.getenv('ASGI_WORKERS', '1'))
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '16'))  # threads per worker for the Flask routes
+STREAM_CHUNK_SIZE = 256 * 1024
+
+mongo = {}  # async client / collection, made inside the worker's event loop
+drive = {'credentials': None, 'http': None}
+
+def parse_range(header, size):
+    """(start, end) for a single 'bytes=a-b' range, None to send the whole file,
+    False if the range can't be satisfied"""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start_text, _, end_text = header[6:].strip().partition('-')
+    try:
+        if start_text == '':
+            suffix = int(end_text)
+            if suffix == 0:
+                return False
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return False
+    return start, end
+
+async def send_file_async(request, directory, filename):
+    """Stream a file with ETag/304 and byte range support, reading it asynchronously.
+    Returns None if the file isn't there."""
+    path = safe_join(directory, filename)
+    if path is None:
+        return None
+    try:
+        stat = await anyio.Path(path).stat()
+    except OSError:
+        return None
+
+    size = stat.st_size
+    etag = f'"{int(stat.st_mtime):x}-{size:x}"'
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': formatdate(stat.st_mtime, usegmt=True),
+        'Cache-Control': f'public, max-age={VIDEO_CACHE_MAX_AGE}'
+    }
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+
+    byte_range = parse_range(request.headers.get('range'), size)
+    if byte_range is False:
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+    start, end = byte_range or (0, size - 1)
+    if byte_range:
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(end - start + 1)
+    status = 206 if byte_range else 200
+    media_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    if request.method == 'HEAD':
+        return Response(status_code=status, headers=headers, media_type=media_type)
+
+    async def body():
+        async with await anyio.open_file(path, 'rb') as f:
+            await f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await f.read(min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    return StreamingResponse(body(), status_code=status, headers=headers, media_type=media_type)
+
+async def drive_token():
+    """Access token for the Drive service account, refreshed off the event loop"""
+    if drive['credentials'] is None:
+        drive['credentials'] = service_account.Credentials.from_service_account_file(
+            GOOGLE_CREDENTIALS_PATH, scopes=['https://www.googleapis.com/auth/drive.readonly']
+        )
+    if not drive['credentials'].valid:
+        await anyio.to_thread.run_sync(drive['credentials'].refresh, GoogleAuthRequest())
+    return drive['credentials'].token
+
+def warm_gdrive_cache(filename, file_id):
+    """Copy a Drive video into the local cache in the background (once)"""
+    with gdrive_cache_lock:
+        if gdrive_cache_name(file_id, filename) in gdrive_cache_inflight:
+            return
+    thread = threading.Thread(target=get_cached_gdrive_file, args=(filename, file_id))
+    thread.daemon = True
+    thread.start()
+
+async def serve_drive_video(request, filename, file_id):
+    """Drive video from the local cache if we have it, otherwise streamed straight from
+    Drive (Range passed through) while the cache fills in the background"""
+    cache_name = lookup_gdrive_cache(filename, file_id)
+    if cache_name:
+        response = await send_file_async(request, GDRIVE_CACHE_FOLDER, cache_name)
+        if response is not None:
+            return response
+
+    if not file_id:
+        file_id = await anyio.to_thread.run_sync(find_google_drive_file_id, filename)
+    if not file_id or not GOOGLE_CREDENTIALS_PATH:
+        return None
+
+    headers = {'Authorization': f'Bearer {await drive_token()}'}
+    if request.headers.get('range'):
+        headers['Range'] = request.headers['range']
+    upstream = await drive['http'].send(
+        drive['http'].build_request(
+            request.method if request.method == 'HEAD' else 'GET',
+            f'https://www.googleapis.com/drive/v3/files/{file_id}',
+            params={'alt': 'media', 'supportsAllDrives': 'true'},
+            headers=headers
+        ),
+        stream=True
+    )
+    if upstream.status_code not in (200, 206):
+        await upstream.aclose()
+        print(f"❌ Google Drive returned {upstream.status_code} for {filename}")
+        return None
+
+    warm_gdrive_cache(filename, file_id)
+    passthrough = {k: upstream.headers[k] for k in ('content-length', 'content-range') if k in upstream.headers}
+    passthrough['Accept-Ranges'] = 'bytes'
+    passthrough['Cache-Control'] = f'public, max-age={VIDEO_CACHE_MAX_AGE}'
+    return StreamingResponse(
+        upstream.aiter_raw(),
+        status_code=upstream.status_code,
+        headers=passthrough,
+        media_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        background=BackgroundTask(upstream.aclose)
+    )
+
+async def serve_video(request, retried=False):
+    """Async twin of cov_web.serve_video - same location cache, same lookup rules"""
+    filename = request.path_params['filename']
+    with video_location_cache_lock:
+        location = video_location_cache.get(filename)
+    cached = location is not None
+
+    try:
+        if not cached:
+            inspection = await mongo['inspections'].find_one({'video_filename': filename}, VIDEO_LOCATION_FIELDS)
+            location = video_location_for(filename, inspection)
+            if location is None:
+                return PlainTextResponse(f"Video not found: {filename}", status_code=404)
+            with video_location_cache_lock:
+                if len(video_location_cache) >= VIDEO_LOCATION_CACHE_MAX:
+                    video_location_cache.pop(next(iter(video_location_cache)))
+                video_location_cache[filename] = location
+
+        if location[0] == 'local':
+            response = await send_file_async(request, UPLOAD_FOLDER, location[1])
+        else:
+            response = await serve_drive_video(request, location[1], location[2])
+    except Exception as e:
+        print(f"❌ Error serving video {filename}: {e}")
+        response = None
+
+    if response is None:
+        # file moved since we cached it - look it up fresh once
+        invalidate_video_location(filename)
+        if cached and not retried:
+            return await serve_video(request, retried=True)
+        return PlainTextResponse(f"Video not found: {filename}", status_code=404)
+    return response
+
+@contextlib.asynccontextmanager
+async def lifespan(asgi_app):
+    client = AsyncIOMotorClient(
+        MONGODB_URI,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS
+    )
+    mongo['inspections'] = client[MONGODB_DATABASE]['inspections']
+    drive['http'] = httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=None))
+    try:
+        yield
+    finally:
+        await drive['http'].aclose()
+        client.close()
+
+routes = []
+if MEDIA_ACCEL_MODE != 'x-accel':
+    # with x-accel the proxy moves the bytes anyway, so Flask's /video is already cheap
+    routes.append(Route('/video/{filename}', serve_video, methods=['GET', 'HEAD']))
+routes.append(Mount('/', app=WSGIMiddleware(app, workers=ASGI_WSGI_THREADS)))
+
+asgi_app = Starlette(routes=routes, lifespan=lifespan)
+
+# -----------------------------
+# Start Uvicorn on configured host:port
+# -----------------------------
+if __name__ == '__main__':
+    host = os.getenv('FLASK_HOST', '0.0.0.0')
+    port = int(os.getenv('FLASK_PORT', 8500))
+
+    print("=" * 60)
+    print("🚀 COV Inspection Tool - ASGI Server")
+    print("=" * 60)
+    print(f"🗄️  MongoDB: {MONGODB_DATABASE}")
+    print(f"🌐 Server: {host}:{port}")
+    print(f"⚙️  Workers: {ASGI_WORKERS} (Flask routes: {ASGI_WSGI_THREADS} threads each)")
+    print("🎬 Video and Google Drive streaming: async")
+    if ASGI_WORKERS > 1:
+        print("⚠️  ASGI_WORKERS > 1: in-memory caches and the Drive cache budget are per process")
+    print("=" * 60)
+
+    if ASGI_WORKERS == 1:
+        # run in this process - the app (and its startup jobs) is already loaded
+        uvicorn.run(asgi_app, host=host, port=port, proxy_headers=True)
+    else:
+        uvicorn.run('serve_asgi:asgi_app', host=host, port=port, workers=ASGI_WORKERS, proxy_headers=True)
@@ -256,7 +256,7 @@ function displayInspectedVans(inspections) {
                 </div>
                 <div class="video-section">
                     ${inspection.video_filename ? 
-                        `<img src="/thumbnail/${inspection.video_filename.replace(/\.[^/.]+$/, '.jpg')}" 
+                        `<img src="${inspection.thumbnail_url || `/thumbnail/${inspection.video_filename.replace(/\.[^/.]+$/, '.jpg')}`}" 
                              alt="Video thumbnail" 
                              class="video-thumbnail" 
                              onclick="playVideo('${inspection.video_filename}')">` : 
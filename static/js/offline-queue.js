@@ -0,0 +1,200 @@
+// Offline inspection queue
+// Inspections submitted without a connection wait in IndexedDB (the "outbox") until they
+// can go up through /api/inspections/batch, then their videos follow through /attach_video.
+// Also keeps cached reference lookups (van list, CAPID lookups) for offline validation.
+// Loaded by the page and by the service worker (importScripts), so only indexedDB and
+// fetch are used here - no DOM.
+
+const COV_OFFLINE_DB = 'cov-offline';
+const COV_OFFLINE_DB_VERSION = 1;
+const OUTBOX_BATCH_SIZE = 50;
+
+function openOfflineDB() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open(COV_OFFLINE_DB, COV_OFFLINE_DB_VERSION);
+        request.onupgradeneeded = () => {
+            const db = request.result;
+            if (!db.objectStoreNames.contains('outbox')) {
+                db.createObjectStore('outbox', { keyPath: 'idempotency_key' });
+            }
+            if (!db.objectStoreNames.contains('lookups')) {
+                db.createObjectStore('lookups', { keyPath: 'key' });
+            }
+        };
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+// Run one request against a store and resolve with its result once the transaction commits
+function offlineStore(storeName, mode, action) {
+    return openOfflineDB().then(db => new Promise((resolve, reject) => {
+        const tx = db.transaction(storeName, mode);
+        const request = action(tx.objectStore(storeName));
+        tx.oncomplete = () => {
+            db.close();
+            resolve(request ? request.result : undefined);
+        };
+        tx.onerror = () => {
+            db.close();
+            reject(tx.error);
+        };
+    }));
+}
+
+function outboxPut(item) {
+    return offlineStore('outbox', 'readwrite', store => store.put(item));
+}
+
+function outboxAll() {
+    return offlineStore('outbox', 'readonly', store => store.getAll());
+}
+
+function outboxDelete(key) {
+    return offlineStore('outbox', 'readwrite', store => store.delete(key));
+}
+
+function lookupSave(key, value) {
+    return offlineStore('lookups', 'readwrite', store => store.put({ key: key, value: value, saved_at: Date.now() }));
+}
+
+function lookupGet(key) {
+    return offlineStore('lookups', 'readonly', store => store.get(key)).then(row => row ? row.value : null);
+}
+
+// Send everything waiting in the outbox. The page and the service worker (and other tabs)
+// can all try at once, so only one of them flushes at a time: a Web Lock where the
+// browser has them, otherwise a lease row in IndexedDB. The server still ignores
+// idempotency keys it already has if two flushes ever overlap.
+const OUTBOX_LOCK_NAME = 'cov-outbox-flush';
+const OUTBOX_LEASE_KEY = 'outbox-flush-lease';
+const OUTBOX_LEASE_MS = 5 * 60 * 1000;
+let outboxFlushing = null;
+
+function flushOutbox() {
+    if (!outboxFlushing) {
+        outboxFlushing = flushOutboxExclusive().finally(() => { outboxFlushing = null; });
+    }
+    return outboxFlushing;
+}
+
+function flushOutboxExclusive() {
+    if (typeof navigator !== 'undefined' && navigator.locks) {
+        // ifAvailable: if another context is flushing, its flush covers our items too
+        return navigator.locks.request(OUTBOX_LOCK_NAME, { ifAvailable: true },
+            lock => lock ? sendOutbox(() => Promise.resolve(true)) : 0);
+    }
+    const owner = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    return takeOutboxLease(owner).then(acquired => {
+        if (!acquired) {
+            return 0;
+        }
+        return sendOutbox(() => takeOutboxLease(owner))
+            .finally(() => releaseOutboxLease(owner).catch(() => {}));
+    });
+}
+
+// Take (or renew) the flush lease unless another context holds an unexpired one.
+// The read and the write share one readwrite transaction, so two contexts can't both win.
+function takeOutboxLease(owner) {
+    return openOfflineDB().then(db => new Promise((resolve, reject) => {
+        const tx = db.transaction('lookups', 'readwrite');
+        const store = tx.objectStore('lookups');
+        let acquired = false;
+        const request = store.get(OUTBOX_LEASE_KEY);
+        request.onsuccess = () => {
+            const lease = request.result ? request.result.value : null;
+            if (!lease || lease.owner === owner || lease.expires_at < Date.now()) {
+                store.put({ key: OUTBOX_LEASE_KEY, value: { owner: owner, expires_at: Date.now() + OUTBOX_LEASE_MS }, saved_at: Date.now() });
+                acquired = true;
+            }
+        };
+        tx.oncomplete = () => {
+            db.close();
+            resolve(acquired);
+        };
+        tx.onerror = () => {
+            db.close();
+            reject(tx.error);
+        };
+    }));
+}
+
+function releaseOutboxLease(owner) {
+    return offlineStore('lookups', 'readwrite', store => {
+        const request = store.get(OUTBOX_LEASE_KEY);
+        request.onsuccess = () => {
+            if (request.result && request.result.value.owner === owner) {
+                store.delete(OUTBOX_LEASE_KEY);
+            }
+        };
+        return null;
+    });
+}
+
+// keepLease() is checked before each upload so a flush that lost its lease (it ran past
+// OUTBOX_LEASE_MS and another context took over) stops instead of sending twice
+async function sendOutbox(keepLease) {
+    let sent = 0;
+
+    // inspection records first - a whole batch per request
+    const waiting = (await outboxAll()).filter(item => !item.inspection_id);
+    for (let start = 0; start < waiting.length; start += OUTBOX_BATCH_SIZE) {
+        const batch = waiting.slice(start, start + OUTBOX_BATCH_SIZE);
+        if (!(await keepLease())) {
+            throw new Error('Another window took over sending the outbox');
+        }
+        const response = await fetch('/api/inspections/batch', {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                inspections: batch.map(item => Object.assign({}, item.fields, { idempotency_key: item.idempotency_key }))
+            })
+        });
+        if (!response.ok) {
+            throw new Error(`Batch upload failed (${response.status})`);
+        }
+        const data = await response.json();
+
+        for (const result of data.results) {
+            const item = batch[result.index];
+            if (result.status === 'created' || result.status === 'duplicate') {
+                if (item.video) {
+                    // keep it until the video is up too
+                    item.inspection_id = result.inspection_id;
+                    item.last_error = null;
+                    await outboxPut(item);
+                } else {
+                    await outboxDelete(item.idempotency_key);
+                    sent++;
+                }
+            } else {
+                // e.g. the event got locked - leave it for someone to look at
+                item.last_error = result.message;
+                await outboxPut(item);
+            }
+        }
+    }
+
+    // then the videos, one upload at a time
+    const videos = (await outboxAll()).filter(item => item.inspection_id && item.video);
+    for (const item of videos) {
+        if (!(await keepLease())) {
+            throw new Error('Another window took over sending the outbox');
+        }
+        const formData = new FormData();
+        formData.append('inspection_id', item.inspection_id);
+        formData.append('inspection_video', item.video, item.video_name);
+        const response = await fetch('/attach_video', { method: 'POST', body: formData, credentials: 'same-origin' });
+        if (response.ok) {
+            await outboxDelete(item.idempotency_key);
+            sent++;
+        } else {
+            item.last_error = `Video upload failed (${response.status})`;
+            await outboxPut(item);
+        }
+    }
+
+    return sent;
+}
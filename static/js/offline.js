@@ -0,0 +1,181 @@
+// Page side of offline support: registers the service worker, keeps the van list cached
+// for offline validation, and puts inspections in the outbox (offline-queue.js) when
+// /upload can't be reached.
+
+function registerOfflineSupport() {
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register('/service-worker.js')
+            .catch(error => console.error('Service worker registration failed:', error));
+        navigator.serviceWorker.addEventListener('message', event => {
+            if (event.data && event.data.type === 'outbox-flushed') {
+                outboxFlushed(event.data.sent);
+            }
+        });
+    }
+
+    window.addEventListener('online', () => {
+        refreshReferenceData();
+        flushOutboxNow();
+    });
+    window.addEventListener('offline', updateOutboxIndicator);
+
+    refreshReferenceData();
+    flushOutboxNow();
+}
+
+// Van list from CAPWATCH, revalidated against the server's version tag (304 when unchanged)
+function refreshReferenceData() {
+    return lookupGet('vans')
+        .then(cached => {
+            const headers = cached && cached.version ? { 'If-None-Match': `"${cached.version}"` } : {};
+            return fetch('/api/reference/vans', { headers: headers, cache: 'no-store', credentials: 'same-origin' })
+                .then(response => {
+                    if (response.status === 304 || !response.ok) {
+                        return cached;
+                    }
+                    return response.json().then(data => lookupSave('vans', data).then(() => data));
+                });
+        })
+        .catch(error => {
+            console.warn('Could not refresh reference data:', error);
+            return null;
+        });
+}
+
+// /check_van, falling back to the cached van list when there's no connection
+function checkVanWithFallback(vanNumber) {
+    return fetch('/check_van', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ van_number: vanNumber })
+    })
+    .then(r => r.json())
+    .catch(error => lookupGet('vans').then(reference => {
+        if (!reference) {
+            throw error;
+        }
+        const vin = reference.vans[vanNumber];
+        return vin === undefined
+            ? { status: 'invalid', vin_id: '', offline: true }
+            : { status: 'valid', vin_id: vin, offline: true };
+    }));
+}
+
+// /check_capid, remembering members we've looked up so they can sign in offline later
+function checkCapidWithFallback(capid) {
+    return fetch('/check_capid', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ capid })
+    })
+    .then(r => r.json())
+    .then(data => {
+        if (data.status === 'found') {
+            lookupSave(`capid:${capid}`, data).catch(() => {});
+        }
+        return data;
+    })
+    .catch(error => lookupGet(`capid:${capid}`).then(data => {
+        if (!data) {
+            throw error;
+        }
+        return Object.assign({}, data, { offline: true });
+    }));
+}
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// Save a submitted inspection (FormData from the form, video included) in the outbox
+function queueInspectionOffline(formData) {
+    const fields = {};
+    let video = null;
+    let videoName = '';
+    for (const [name, value] of formData.entries()) {
+        if (value instanceof Blob) {
+            video = value;
+            videoName = value.name || 'inspection_video.mp4';
+        } else {
+            fields[name] = value;
+        }
+    }
+    const key = fields.idempotency_key || newIdempotencyKey();
+    delete fields.idempotency_key;
+
+    return outboxPut({
+        idempotency_key: key,
+        fields: fields,
+        video: video,
+        video_name: videoName,
+        inspection_id: null,
+        queued_at: Date.now(),
+        last_error: null
+    })
+    .then(requestOutboxSync)
+    .then(updateOutboxIndicator);
+}
+
+// Background sync sends the outbox even if the tablet closes the page; browsers
+// without it get flushed from the page when the connection comes back
+function requestOutboxSync() {
+    if ('serviceWorker' in navigator && 'SyncManager' in window) {
+        return navigator.serviceWorker.ready
+            .then(registration => registration.sync.register('flush-inspections'))
+            .catch(error => console.warn('Background sync not available:', error));
+    }
+    return Promise.resolve();
+}
+
+function flushOutboxNow() {
+    if (!navigator.onLine) {
+        return updateOutboxIndicator();
+    }
+    return flushOutbox()
+        .then(outboxFlushed)
+        .catch(error => {
+            console.warn('Offline inspections not sent yet:', error);
+            updateOutboxIndicator();
+        });
+}
+
+function outboxFlushed(sent) {
+    if (sent && typeof showSuccessMessage === 'function') {
+        showSuccessMessage(`${sent} saved inspection${sent === 1 ? '' : 's'} uploaded`);
+    }
+    return updateOutboxIndicator();
+}
+
+// Small badge in the corner while anything is still waiting to upload
+function updateOutboxIndicator() {
+    return outboxAll().then(items => {
+        let badge = document.getElementById('offlineQueueStatus');
+        if (!items.length) {
+            if (badge) {
+                badge.remove();
+            }
+            return;
+        }
+        if (!badge) {
+            badge = document.createElement('div');
+            badge.id = 'offlineQueueStatus';
+            badge.className = 'alert alert-info';
+            badge.style.position = 'fixed';
+            badge.style.bottom = '20px';
+            badge.style.left = '20px';
+            badge.style.zIndex = '9999';
+            badge.style.maxWidth = '300px';
+            badge.style.cursor = 'pointer';
+            badge.title = 'Tap to try uploading now';
+            badge.addEventListener('click', flushOutboxNow);
+            document.body.appendChild(badge);
+        }
+        const problems = items.filter(item => item.last_error).length;
+        badge.textContent = `📤 ${items.length} inspection${items.length === 1 ? '' : 's'} waiting to upload` +
+            (navigator.onLine ? '' : ' (offline)') +
+            (problems ? ` - ${problems} need attention` : '');
+    }).catch(error => console.warn('Could not read offline queue:', error));
+}
@@ -0,0 +1,123 @@
+// Service worker for the inspection app (served as /service-worker.js so it covers the whole site)
+// - precaches the app shell so the form opens without a connection
+// - events / missing videos: network first (the browser revalidates with the ETag), cached copy offline
+// - flushes the offline inspection outbox when background sync fires
+importScripts('/static/js/offline-queue.js');
+
+// bump when the shell list changes
+const SHELL_CACHE = 'cov-shell-v2';
+const DATA_CACHE = 'cov-data-v1';
+
+const SHELL_ASSETS = [
+    '/',
+    '/static/js/offline-queue.js',
+    '/static/js/offline.js',
+    '/static/images/pawg_patch.png',
+    '/static/images/cov_web_icon.png',
+    '/static/images/video_placeholder.png'
+];
+
+// GET endpoints the form needs that are fine to show slightly stale while offline
+const DATA_PATHS = ['/events', '/missing_videos'];
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(SHELL_CACHE)
+            .then(cache => Promise.all(SHELL_ASSETS.map(url => cacheIfOk(cache, url))))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys
+                .filter(key => key !== SHELL_CACHE && key !== DATA_CACHE)
+                .map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    // uploads always go to the network - the page queues them itself if that fails
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+
+    if (request.mode === 'navigate') {
+        if (url.pathname === '/') {
+            event.respondWith(networkFirst(request, SHELL_CACHE, '/'));
+        }
+        return;
+    }
+    if (url.pathname.startsWith('/static/')) {
+        event.respondWith(staleWhileRevalidate(request, SHELL_CACHE));
+        return;
+    }
+    if (DATA_PATHS.includes(url.pathname)) {
+        event.respondWith(networkFirst(request, DATA_CACHE));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === 'flush-inspections') {
+        // a rejected promise makes the browser retry the sync later
+        event.waitUntil(flushOutbox().then(notifyClients));
+    }
+});
+
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'flush-outbox') {
+        event.waitUntil(flushOutbox().then(notifyClients).catch(() => {}));
+    }
+});
+
+function cacheIfOk(cache, url) {
+    // a redirect (e.g. to the login page) must not end up cached as the app
+    return fetch(url, { credentials: 'same-origin' })
+        .then(response => {
+            if (response.ok && !response.redirected) {
+                return cache.put(url, response);
+            }
+        })
+        .catch(error => console.warn(`Could not precache ${url}:`, error));
+}
+
+function networkFirst(request, cacheName, cacheKey) {
+    const key = cacheKey || request;
+    return fetch(request)
+        .then(response => {
+            if (response.ok && !response.redirected) {
+                const copy = response.clone();
+                caches.open(cacheName).then(cache => cache.put(key, copy));
+            }
+            return response;
+        })
+        .catch(() => caches.match(key).then(cached => cached || Response.error()));
+}
+
+function staleWhileRevalidate(request, cacheName) {
+    return caches.open(cacheName).then(cache => cache.match(request).then(cached => {
+        const refresh = fetch(request)
+            .then(response => {
+                if (response.ok) {
+                    cache.put(request, response.clone());
+                }
+                return response;
+            })
+            .catch(() => cached || Response.error());
+        return cached || refresh;
+    }));
+}
+
+function notifyClients(sent) {
+    return self.clients.matchAll().then(clients => {
+        clients.forEach(client => client.postMessage({ type: 'outbox-flushed', sent: sent }));
+        return sent;
+    });
+}